@@ -1,6 +1,7 @@
 import vtk
 import numpy as np
 import vtk.util.numpy_support as nps
+from helpers.skeleton_graph import getSkeletonGraph
 
 def getJunctionEndPointIds(poly_line):
 	"""
@@ -9,7 +10,7 @@ def getJunctionEndPointIds(poly_line):
 	cell ids of the branches with end vertices are obtained.
 
 	Args:
-		poly_line (vtk.vtkPolyData): skeleton graph
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
 
 	Returns:
 		Dict: dictionary with following key-value pairs:
@@ -19,46 +20,25 @@ def getJunctionEndPointIds(poly_line):
 		- merge_ids: all point ids of vertices where branches should be merged
 		  (np.array, int)
 	"""
-	n_cells = poly_line.GetNumberOfCells()
-	in_cells = vtk.vtkIdList()
-	junction_ids = []
-	end_point_ids = []
-	end_branch_ids = []
-	merge_ids = []
-
-	# loop over every branch
-	for i in range(n_cells):
-		branch = poly_line.GetCell(i)
-		n_points = branch.GetNumberOfPoints()
-		
-		# check the first and last vertex of branch
-		for j in [0, n_points - 1]:
-			point_id = branch.GetPointId(j)
-
-			# check in how many cells these vertices are present
-			poly_line.GetPointCells(point_id, in_cells)
-			n_neigh = in_cells.GetNumberOfIds()
-			
-			# 1: end point, 2: branch should be merges, 3: junction point
-			if n_neigh == 1:
-				end_point_ids.append(point_id)
-				end_branch_ids.append(i)
-			elif n_neigh == 2:
-				merge_ids.append(point_id)
-			else:
-				junction_ids.append(point_id)
+	graph = getSkeletonGraph(poly_line)
+
+	# first and last vertex of every branch (ordered by branch)
+	end_ids = np.column_stack([graph.starts, graph.ends]).ravel()
+	branch_ids = np.repeat(np.arange(graph.n_branches), 2)
+
+	# check in how many cells these vertices are present
+	# 1: end point, 2: branch should be merges, 3: junction point
+	n_neigh = graph.degree[end_ids]
+	is_end = (n_neigh == 1)
+	is_merge = (n_neigh == 2)
+	is_junction = ~(is_end | is_merge)
 
 	# get the set of junction IDs to prevent overlap
-	junction_ids = np.asarray(list(set(junction_ids)), dtype =int)
-	end_point_ids = np.asarray(end_point_ids, dtype=int)
-	end_branch_ids = np.asarray(end_branch_ids, dtype=int)
-	if merge_ids:
-		merge_ids = np.asarray(merge_ids, dtype = int)
 	return {
-				'junctions': junction_ids, 
-				'end_points': end_point_ids, 
-				'end_branches':end_branch_ids, 
-				'merge_ids': merge_ids
+				'junctions': np.unique(end_ids[is_junction]), 
+				'end_points': end_ids[is_end], 
+				'end_branches': branch_ids[is_end], 
+				'merge_ids': end_ids[is_merge]
 		}
 
 ######## IMPROVE
@@ -70,15 +50,16 @@ def getBasicSkelMeasures(poly_line):
 	than da and db (see skel_thickness.py)
 	
 	Args:
-		poly_line (vtk.vtkPolyData): skeleton graph
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
 
 	Returns:
 		Dict: dictrionary with following keys and values:
 		- 
 	"""
-	junc_end = getJunctionEndPointIds(poly_line)
-	thickness = getThicknessDistribution(poly_line)
-	min_max_avg = getMinMaxAvgThick(poly_line, thickness['medial_thickness'])
+	graph = getSkeletonGraph(poly_line)
+	junc_end = getJunctionEndPointIds(graph)
+	thickness = getThicknessDistribution(graph)
+	min_max_avg = getMinMaxAvgThick(graph, thickness['medial_thickness'])
 	ep_raw = junc_end['end_points']
 	eb_raw = junc_end['end_branches']
 	root_id = selectRootId(min_max_avg['avg_thick'], eb_raw, ep_raw)
@@ -115,15 +96,13 @@ def getThicknessDistribution(poly_line):
 	numpy array.
 
 	Args:
-		poly_line (vtk.vtkPolyData): skeleton graph
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
 
 	Returns:
 		Dict: dictionary with key-value:
 		- medial_thickness: point scalars ordered by point id (np.array, float)
 	"""
-	scalars = poly_line.GetPointData().GetScalars()
-	scalars_np = nps.vtk_to_numpy(scalars)
-	return {'medial_thickness':scalars_np}
+	return {'medial_thickness':getSkeletonGraph(poly_line).thickness}
 
 def getIdsBranch(branch):
 	n_points = branch.GetNumberOfPoints()
@@ -138,16 +117,22 @@ def getMinMaxAvgThickIds(thickness, pids):
 
 def getMinMaxAvgThick(poly_line, thickness):
 	"""
+	Obtain the minimum, maximum and average thickness of every branch with 
+	segmented reductions over the point IDs of all branches.
+
+	Args:
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+		thickness (np.array, float): thickness of each vertex
+
+	Returns:
+		Dict: dictionary of numpy arrays (float, ordered by cell ID) with keys
+		- min_thick, max_thick, avg_thick
 	"""
-	n_lines = poly_line.GetNumberOfCells()
-	min_max_avg = np.zeros((n_lines,3))
-	for i in range(n_lines):
-		line = poly_line.GetCell(i)
-		ids = getIdsBranch(line)
-		min_max_avg[i] = getMinMaxAvgThickIds(thickness, ids)
-	min_max_avg = min_max_avg.T
+	graph = getSkeletonGraph(poly_line)
+	thickvals = np.asarray(thickness, dtype = float)[graph.point_ids]
+	starts = graph.offsets[:-1]
 	return {
-			'min_thick': min_max_avg[0], 
-			'max_thick': min_max_avg[1], 
-			'avg_thick': min_max_avg[2]
+			'min_thick': np.minimum.reduceat(thickvals, starts), 
+			'max_thick': np.maximum.reduceat(thickvals, starts), 
+			'avg_thick': np.add.reduceat(thickvals, starts) / graph.branch_sizes
 		}
\ No newline at end of file
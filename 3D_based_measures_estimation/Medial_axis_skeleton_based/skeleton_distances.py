@@ -2,7 +2,11 @@ import copy
 import math as m 
 import numpy as np
 import vtk
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
 from .basic_skeleton_measures import getBasicSkelMeasures
+from helpers.skeleton_graph import getSkeletonGraph
 
 def getSkeletonDistances(poly_line, min_length = 4):
 	
@@ -11,7 +15,7 @@ def getSkeletonDistances(poly_line, min_length = 4):
 	graph (branch length, branching rate, branch spacing).
 
 	Args:
-		poly_line (vtk.vtkPolyData): skeleton graph
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
 		min_length (int): minimum number of vertices in branch to be considered
 			for analyses
 	
@@ -24,28 +28,40 @@ def getSkeletonDistances(poly_line, min_length = 4):
 			- br_spacing_v1_loc: vertex IDs of br_spacing_v1
 			- br_spacing_v2: branch spacing v2 (float)
 			- br_spacing_v2_loc: vertex IDs of br_spacing_v2
+			- br_spacing_geo: geodesic branch spacing (float)
+			- root_tip_geo: geodesic distance from root to branch tip (float)
+			- tortuosity: geodesic/Euclidean distance from root to branch tip 
+			  (float)
+			- br_spacing_geo_loc, root_tip_geo_loc, tortuosity_loc: vertex IDs
+			  of geodesic measures
 	"""
 
 	# get end vertices and corresponding end branches
-	skel_info = getBasicSkelMeasures(poly_line)
+	graph = getSkeletonGraph(poly_line)
+	skel_info = getBasicSkelMeasures(graph)
 	end_points = copy.deepcopy(skel_info['end_points'])
 	end_branches = copy.deepcopy(skel_info['end_branches'])
+	root_point = skel_info['root_point']
 	del skel_info
 
 	# get measures related to branch distances 
-	lengths = getBranchLengths(poly_line, min_length)
-	br_sp1 = getBranchSpacing(poly_line, end_points, end_branches)
-	br_sp2 = getEndSpacing(poly_line, end_points, end_branches)
-	return {**lengths, **br_sp1, **br_sp2}
+	lengths = getBranchLengths(graph, min_length)
+	br_sp1 = getBranchSpacing(graph, end_points, end_branches)
+	br_sp2 = getEndSpacing(graph, end_points, end_branches)
+	geo = getGeodesicDistances(graph, end_points, root_point, 
+		lengths['br_length'])
+	return {**lengths, **br_sp1, **br_sp2, **geo}
 
 def getBranchLengths(poly_line, min_length = 4):
 	"""
 	Obtain branch length and brancing rate of all branches in a skeleton graph.
 	Branch length is sum of all edge lengths in a branch. Branch rate is the 
 	distance between the first and last vertex of a branch.
+	All branches are processed at once with segmented sums over the point IDs
+	of all branches.
 
 	Args:
-		poly_line (vtk.vtkPolydata): skeleton graph
+		poly_line (vtk.vtkPolydata or SkeletonGraph): skeleton graph
 		min_length (int) : number of vertices a branch should have for analysis
 
 	Returns:
@@ -55,20 +71,21 @@ def getBranchLengths(poly_line, min_length = 4):
 			- long_enough: suitable for analysis (bool, ordered by cell ID)
 	"""
 	
-	# obtain number of cells (/branches)
-	n_lines = poly_line.GetNumberOfCells()
-	lengths = np.zeros(n_lines)
-	rates = np.zeros(n_lines)
-	enough_points = np.zeros(n_lines, dtype = bool)
-	points = poly_line.GetPoints()
-	# loop over all branches
-	for i in range(n_lines):
-		branch = poly_line.GetCell(i)
-		
-		# obtain branch length, branching rate and suitability for analysis
-		lengths[i] = getLineLength(branch,points)
-		rates[i] = getLineRate(branch,points)
-		enough_points[i] = longEnough(branch, min_length)
+	graph = getSkeletonGraph(poly_line)
+	starts = graph.offsets[:-1]
+	coords = graph.points[graph.point_ids]
+
+	# length of the edge ending at every vertex of a branch (0 for the first
+	# vertex), summed per branch
+	edges = np.zeros(coords.shape[0])
+	edges[1:] = np.sqrt(np.sum(np.diff(coords, axis = 0) ** 2, axis = 1))
+	edges[starts] = 0
+	lengths = np.add.reduceat(edges, starts)
+
+	# distance between first and last vertex
+	rates = np.sqrt(np.sum((graph.points[graph.ends] - 
+		graph.points[graph.starts]) ** 2, axis = 1))
+	enough_points = (graph.branch_sizes >= min_length)
 	# dictionary of all metrics per branch ID
 	return {'br_length': lengths, 'br_rate': rates, 'long_enough': enough_points}
 
@@ -139,10 +156,10 @@ def getBranchSpacing(poly_line, end_points, end_branches):
 	"""
 	Get branch_spacing_v1: the shortest distance between a branch tip and a 
 	vertex of the skeleton graph that is not part of the corresponding branch
-	(see [1]).
+	(see [1]). All tips are queried at once in a KD-tree of the vertices.
 
 	Args:
-		poly_line (vtk.vtkPolyData): skeleton graph
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
 		end_points (np.array,int): vertex IDs of branch tips
 		end_branches (np.array,int): cell IDs of branches of end_points
 	
@@ -154,38 +171,48 @@ def getBranchSpacing(poly_line, end_points, end_branches):
 
 	[1]: OUR PAPER
 	"""
+	end_points = np.asarray(end_points, dtype = int)
+	end_branches = np.asarray(end_branches, dtype = int)
 	n_ends = len(end_points)
-	branch_spacing = np.zeros(n_ends)
 
 	# get all coordinates of vertices in the skeleton graph
-	point_coords = getSkelPointLocation(poly_line)
-	n_points = point_coords.shape[0]
-	
-	# loop over every terminal branch
-	for i in range(n_ends):
-		
-		# get branch and point ids in branch
-		branch = poly_line.GetCell(end_branches[i])
-		pid_branch = getPointIdsBranch(branch)
-		ep_coord = point_coords[end_points[i]]
-
-		# select all the points, except those in own branch
-		mask = np.ones(n_points, dtype = bool)
-		mask[pid_branch] = False 
-		point_coord_branch = point_coords[mask]
-
-		# get closest point outside own branch
-		branch_spacing[i] = getSpacing(point_coord_branch, ep_coord)
+	graph = getSkeletonGraph(poly_line)
+	point_coords = graph.points
+	if not n_ends:
+		return {'br_spacing_v1': np.zeros(0), 'br_spacing_v1_loc': end_points}
+
+	# branch ID of every vertex, vertices in multiple branches are the first 
+	# or last vertex of these branches
+	labels = np.full(graph.n_points, -1)
+	labels[graph.point_ids] = graph.getBranchLabels()
+
+	# the k nearest vertices of every tip always contain a vertex outside its
+	# own branch if k is larger than the number of vertices in the branch
+	k = min(np.max(graph.branch_sizes[end_branches]) + 1, graph.n_points)
+	tree = cKDTree(point_coords)
+	dist, nbors = tree.query(point_coords[end_points], k = k)
+	dist = dist.reshape(n_ends, k)
+	nbors = nbors.reshape(n_ends, k)
+
+	# exclude the vertices of the own branch
+	own_branch = (labels[nbors] == end_branches[:, None]) | \
+		(nbors == graph.starts[end_branches][:, None]) | \
+		(nbors == graph.ends[end_branches][:, None])
+	dist[own_branch] = np.inf
+
+	# get closest point outside own branch
+	branch_spacing = np.min(dist, axis = 1)
 		
 	return {'br_spacing_v1': branch_spacing, 'br_spacing_v1_loc': end_points}
 
 def getEndSpacing(poly_line, end_points, end_branches):
 	"""
 	Get branch_spacing_v2: the shortest distance between a branch tip and any
-	other branch tip (see [1]).
+	other branch tip (see [1]). All tips are queried at once in a KD-tree of 
+	the tips.
 
 	Args:
-		poly_line (vtk.vtkPolyData): skeleton graph
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
 		end_points (np.array,int): vertex IDs of branch tips
 		end_branches (np.array,int): cell IDs of branches of end_points
 	
@@ -198,24 +225,114 @@ def getEndSpacing(poly_line, end_points, end_branches):
 	[1]: OUR PAPER
 	"""
 	n_ends = len(end_points)
-	end_point_spacing = np.zeros(n_ends)
+	end_point_spacing = np.full(n_ends, np.inf)
 
 	# get coordinates of end point vertices in the graph
-	point_coords = getSkelPointLocation(poly_line)
-	end_coords = copy.deepcopy(point_coords[end_points,:])
+	point_coords = getSkeletonGraph(poly_line).points
+	end_coords = point_coords[end_points,:]
 	del point_coords
+	if n_ends < 2:
+		return {'br_spacing_v2':end_point_spacing, 'br_spacing_v2_loc':end_points}
 	
-	# loop over end points
-	for i in range(n_ends):
-		# get coordinates of end point
-		coord_tip = end_coords[i]
-		# get the other end points
-		other_coords = np.delete(end_coords, i,axis=0)
-		# find shortest distance
-		end_point_spacing[i] = getSpacing(other_coords, coord_tip)
+	# the two nearest tips are the tip itself and the closest other tip (or
+	# the other way around if they have the same location)
+	tree = cKDTree(end_coords)
+	dist, nbors = tree.query(end_coords, k = 2)
+	is_self = (nbors[:, 0] == np.arange(n_ends))
+	end_point_spacing = np.where(is_self, dist[:, 1], dist[:, 0])
 
 	return {'br_spacing_v2':end_point_spacing, 'br_spacing_v2_loc':end_points}
 
+def getGeodesicDistances(poly_line, end_points, root_point, lengths = None):
+	"""
+	Get distances along the skeleton graph: geodesic branch spacing (shortest
+	path from a branch tip to any other branch tip), geodesic distance from
+	the root to every branch tip and the tortuosity (geodesic / Euclidean 
+	distance from the root to every branch tip). The shortest paths from all
+	tips and the root are obtained at once on the weighted adjacency of the
+	branch ends (see getBranchAdjacency).
+
+	Args:
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+		end_points (np.array,int): vertex IDs of branch tips
+		root_point (int): vertex ID of the root
+		lengths (np.array, float): branch length of each branch (see 
+			getBranchLengths), calculated if None
+
+	Returns:
+		Dict: dictionary of numpy arrays (float, inf if not connected) with
+		keys
+			- br_spacing_geo: geodesic branch spacing
+			- br_spacing_geo_loc: vertex IDs of br_spacing_geo
+			- root_tip_geo: geodesic distance from root to branch tip
+			- root_tip_geo_loc: vertex IDs of root_tip_geo
+			- tortuosity: geodesic/Euclidean distance from root to branch tip
+			- tortuosity_loc: vertex IDs of tortuosity
+	"""
+	graph = getSkeletonGraph(poly_line)
+	end_points = np.asarray(end_points, dtype = int)
+	n_ends = len(end_points)
+	if lengths is None:
+		lengths = getBranchLengths(graph)['br_length']
+	adjacency, node_ids = getBranchAdjacency(graph, lengths)
+
+	# shortest paths from all tips and the root to all branch ends
+	sources = np.searchsorted(node_ids, np.append(end_points, root_point))
+	dist = dijkstra(adjacency, directed = False, indices = sources)
+
+	# closest other tip
+	tip_dist = dist[:n_ends, sources[:n_ends]]
+	tip_dist[np.arange(n_ends), np.arange(n_ends)] = np.inf
+	spacing = np.min(tip_dist, axis = 1) if n_ends else np.zeros(0)
+
+	# geodesic and Euclidean distance to the root
+	root_geo = dist[n_ends, sources[:n_ends]]
+	root_eucl = np.sqrt(np.sum((graph.points[end_points] - 
+		graph.points[root_point]) ** 2, axis = 1))
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		tortuosity = root_geo / root_eucl
+
+	return {
+			'br_spacing_geo': spacing, 'br_spacing_geo_loc': end_points, 
+			'root_tip_geo': root_geo, 'root_tip_geo_loc': end_points, 
+			'tortuosity': tortuosity, 'tortuosity_loc': end_points
+		}
+
+def getBranchAdjacency(poly_line, lengths):
+	"""
+	Obtain the weighted sparse adjacency matrix of the branch ends (first and
+	last vertex of every branch) of a skeleton graph. Vertices inside a branch 
+	are part of one branch only, so shortest paths between branch ends along 
+	the skeleton graph follow complete branches and the weight of an edge is
+	the branch length (the shortest one for parallel branches).
+
+	Args:
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+		lengths (np.array, float): branch length of each branch (see 
+			getBranchLengths)
+
+	Returns:
+		scipy.sparse.csr_matrix (float): n_nodes x n_nodes adjacency matrix
+		np.array (int): vertex ID of each node (sorted)
+	"""
+	graph = getSkeletonGraph(poly_line)
+	node_ids = np.unique(np.append(graph.starts, graph.ends))
+	n_nodes = len(node_ids)
+	first = np.searchsorted(node_ids, graph.starts)
+	last = np.searchsorted(node_ids, graph.ends)
+
+	# keep the shortest branch between every pair of nodes (no loops)
+	low, high = np.minimum(first, last), np.maximum(first, last)
+	keys, inverse = np.unique(low * n_nodes + high, return_inverse = True)
+	weights = np.full(len(keys), np.inf)
+	np.minimum.at(weights, inverse, np.asarray(lengths, dtype = float))
+	low, high = keys // n_nodes, keys % n_nodes
+	keep = (low != high)
+
+	adjacency = coo_matrix((weights[keep], (low[keep], high[keep])), 
+		shape = (n_nodes, n_nodes)).tocsr()
+	return adjacency, node_ids
+
 
 def getSkelPointLocation(poly_data):
 	
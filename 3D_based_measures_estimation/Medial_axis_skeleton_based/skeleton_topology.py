@@ -0,0 +1,174 @@
+import copy
+import numpy as np
+from collections import deque
+from .basic_skeleton_measures import getBasicSkelMeasures
+from .skeleton_distances import getBranchLengths
+from helpers.skeleton_graph import getSkeletonGraph
+
+def getSkeletonTopology(poly_line):
+	"""
+	Obtains topological measures of a skeleton graph rooted at the root branch
+	(see basic_skeleton_measures.selectRootId): branch generation,
+	Strahler order and geodesic length from the root to every branch tip.
+
+	Args:
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+
+	Returns:
+		Dict: dictionary of numpy arrays with keys
+			- br_generation: generation of each branch, 1 for the root branch
+			  (int, ordered by cell ID)
+			- br_order: Strahler (Horton-Strahler) order of each branch, 1 for
+			  end branches (int, ordered by cell ID)
+			- root_tip_length: length along the rooted tree from the root
+			  vertex to every end point (float), for skeleton graphs with loops
+			  this is not necessarily the shortest path
+			- root_tip_length_loc: vertex IDs of root_tip_length
+	"""
+	graph = getSkeletonGraph(poly_line)
+	skel_info = getBasicSkelMeasures(graph)
+	end_points = copy.deepcopy(skel_info['end_points'])
+	root_branch = skel_info['root_branch']
+	root_point = skel_info['root_point']
+	del skel_info
+
+	tree = getRootedTree(graph, root_branch, root_point)
+	lengths = getBranchLengths(graph)['br_length']
+	order = getStrahlerOrder(tree)
+	path_length = getRootPathLength(tree, lengths)
+
+	# the distal vertex of an end branch is its end point
+	tip_branch = np.full(graph.n_points, -1)
+	tip_branch[tree['distal'][tree['order']]] = tree['order']
+	tip_branch = tip_branch[end_points]
+	tip_length = np.where(tip_branch >= 0, path_length[tip_branch], np.nan)
+	return {
+			'br_generation': tree['depth'] + 1,
+			'br_order': order,
+			'root_tip_length': tip_length,
+			'root_tip_length_loc': end_points
+		}
+
+def getRootedTree(poly_line, root_branch, root_point):
+	"""
+	Obtains a rooted tree index of a skeleton graph with one breadth-first
+	search over the branches, starting at the root branch. A branch is
+	connected to the branches at its distal vertex; branches that are reached
+	twice (loops in the skeleton graph) keep their first parent.
+
+	Args:
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+		root_branch (int): cell ID of the root branch
+		root_point (int): vertex ID of the root (end point of root branch)
+
+	Returns:
+		Dict: dictionary of numpy arrays (int, ordered by cell ID, except
+		order) with keys
+			- parent: cell ID of the parent branch (-1 for the root branch and
+			  branches that are not connected to it)
+			- depth: number of branches between branch and root branch
+			  (-1 if not connected)
+			- subtree_size: number of branches in the subtree of the branch
+			  (including the branch)
+			- proximal: vertex ID of the branch end towards the root
+			- distal: vertex ID of the branch end away from the root
+			- order: cell IDs of the connected branches in breadth-first order
+	"""
+	graph = getSkeletonGraph(poly_line)
+	n_branch = graph.n_branches
+	starts, ends = graph.starts, graph.ends
+	inc_offsets, inc_branches = graph.getPointIncidence()
+
+	parent = np.full(n_branch, -1)
+	depth = np.full(n_branch, -1)
+	proximal = starts.copy()
+	distal = ends.copy()
+	if root_point == ends[root_branch]:
+		proximal[root_branch], distal[root_branch] = ends[root_branch], \
+			starts[root_branch]
+
+	# breadth-first search from the root branch over the distal vertices
+	order = []
+	depth[root_branch] = 0
+	queue = deque([root_branch])
+	while queue:
+		br = queue.popleft()
+		order.append(br)
+		junc_id = distal[br]
+		for child in inc_branches[inc_offsets[junc_id]:inc_offsets[junc_id+1]]:
+			if depth[child] >= 0:
+				continue
+			parent[child] = br
+			depth[child] = depth[br] + 1
+			if starts[child] != junc_id:
+				proximal[child], distal[child] = ends[child], starts[child]
+			queue.append(child)
+	order = np.asarray(order, dtype = int)
+
+	# sum subtree sizes from the leaves to the root
+	subtree_size = np.zeros(n_branch, dtype = int)
+	subtree_size[order] = 1
+	for br in order[:0:-1]:
+		subtree_size[parent[br]] += subtree_size[br]
+
+	return {'parent': parent, 'depth': depth, 'subtree_size': subtree_size,
+		'proximal': proximal, 'distal': distal, 'order': order}
+
+def getStrahlerOrder(tree):
+	"""
+	Obtains the Strahler order of every branch of a rooted tree: end branches
+	have order 1, other branches have the highest order of their children,
+	plus one if at least two children have this order.
+
+	Args:
+		tree (dict): rooted tree index (see getRootedTree)
+
+	Returns:
+		np.array (int): Strahler order of each branch (0 if not connected to
+			the root branch, ordered by cell ID)
+	"""
+	parent = tree['parent']
+	order = tree['order']
+	strahler = np.zeros(len(parent), dtype = int)
+	n_max = np.zeros(len(parent), dtype = int)
+
+	# from the leaves to the root, every branch is final before its parent
+	for br in order[::-1]:
+		if strahler[br] == 0:
+			strahler[br] = 1
+		elif n_max[br] > 1:
+			strahler[br] += 1
+		par = parent[br]
+		if par < 0:
+			continue
+		if strahler[br] > strahler[par]:
+			strahler[par] = strahler[br]
+			n_max[par] = 1
+		elif strahler[br] == strahler[par]:
+			n_max[par] += 1
+	return strahler
+
+def getRootPathLength(tree, lengths):
+	"""
+	Obtains the geodesic length from the root vertex to the distal vertex of
+	every branch of a rooted tree.
+
+	Args:
+		tree (dict): rooted tree index (see getRootedTree)
+		lengths (np.array, float): length of each branch (see
+			skeleton_distances.getBranchLengths)
+
+	Returns:
+		np.array (float): length from the root to the distal vertex of each
+			branch (nan if not connected to the root branch, ordered by cell
+			ID)
+	"""
+	parent = tree['parent']
+	path_length = np.full(len(parent), np.nan)
+
+	# from the root to the leaves, every parent is final before its children
+	for br in tree['order']:
+		path_length[br] = lengths[br]
+		if parent[br] >= 0:
+			path_length[br] += path_length[parent[br]]
+	return path_length
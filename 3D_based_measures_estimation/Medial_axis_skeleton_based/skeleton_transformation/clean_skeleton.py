@@ -1,10 +1,12 @@
 import vtk
-from .clean_polydata import preprocessPolyData
-from ..coral_measures.skeleton.basic_skel_measures import getJunctionEndPointIds
+from .post_skel import preprocessPolyData
+from ..basic_skeleton_measures import getJunctionEndPointIds
 
 import numpy as np
 import vtk.util.numpy_support as nps
 import math as m
+from collections import deque
+from helpers.skeleton_graph import getSkeletonGraph
 
 def reverseEndBranches(poly_line,end_points, end_branches):
 	for i,br in enumerate(end_branches):
@@ -15,65 +17,259 @@ def reverseEndBranches(poly_line,end_points, end_branches):
 	return poly_line
 
 def mergeBranches(line_data):
-	complete = False
-	while not complete:
-		complete = True
-		merge_ids = getJunctionEndPointIds(line_data)['merge_ids']
-		if not len(merge_ids):
-			return line_data
-		to_delete = []
-		lines = []
-		in_cells = vtk.vtkIdList()
-		compid = 0
-		for pid in merge_ids:
-			line_data.GetPointCells(pid, in_cells)
-			cids = [in_cells.GetId(0), in_cells.GetId(1)]
-			for cid in cids:
-				if cid in to_delete:
-					complete = False
-					compid = pid	
-			if complete == False and compid == pid:
-				compid = 0
-				continue
-
-			np_l = [line_data.GetCell(cids[0]).GetNumberOfPoints(),\
-				line_data.GetCell(cids[1]).GetNumberOfPoints()]
-			new_line = vtk.vtkLine()
-			new_line.GetPointIds().SetNumberOfIds(np_l[0] + np_l[1] -1)
-			counter = 0
-			for c in range(2):
-				line = line_data.GetCell(cids[c])
-				if c == 0:
-					rev = (line.GetPointId(0) == pid)
-				else:
-					rev = (line.GetPointId(np_l[c]-1) == pid)
-				if rev:
-					rang = [np_l[c] -1 -i for i in range(np_l[c])]
-				else:
-					rang = [i for i in range(np_l[c])]
-				if c == 1:
-					rang.pop(0)
-				for i in rang:
-					new_line.GetPointIds().SetId(counter, line.GetPointId(i))
-					counter += 1
-				to_delete.append(cids[c])
-			lines.append(new_line)
-
-		cells = vtk.vtkCellArray()
-		
-		for i in range(line_data.GetNumberOfCells()):
-			if i not in to_delete:
-				cells.InsertNextCell(line_data.GetCell(i))
-		for i in range(len(lines)):
-			cells.InsertNextCell(lines[i])
-
-		poly_new = vtk.vtkPolyData()
-		poly_new.DeepCopy(line_data)
-		poly_new.SetLines(cells)
-		line_data = poly_new
-		line_data = preprocessPolyData(line_data, mm_to_cm = False)
+	"""
+	Merges all branches that are connected by vertices in exactly two branches
+	(merge ids). All maximal chains of such branches are found in one walk over
+	the vertex degrees and the lines of the skeleton graph are rebuilt once.
+	Branches that are not merged keep their order, merged branches are added
+	after them.
+
+	Args:
+		line_data (vtk.vtkPolyData): skeleton graph
+
+	Returns:
+		vtk.vtkPolyData: skeleton graph without merge ids
+	"""
+	graph = getSkeletonGraph(line_data)
+	offsets, point_ids = mergeChains(graph.offsets, graph.point_ids, \
+		graph.n_points)
+	if len(offsets) == len(graph.offsets):
+		return line_data
+	line_data = setLines(line_data, offsets, point_ids)
+	line_data = preprocessPolyData(line_data)
 	return line_data
 
+def mergeChains(offsets, point_ids, n_points):
+	"""
+	Merges all chains of lines connected by vertices that are the first or last
+	vertex of exactly two lines (see mergeBranches).
+
+	Args:
+		offsets (np.array, int): start of every line in point_ids (n_lines + 1)
+		point_ids (np.array, int): point IDs of all lines
+		n_points (int): number of vertices
+
+	Returns:
+		np.array (int): start of every merged line in point_ids
+		np.array (int): point IDs of all merged lines
+	"""
+	n_lines = len(offsets) - 1
+	starts = point_ids[offsets[:-1]]
+	ends = point_ids[offsets[1:] - 1]
+	degree = np.bincount(point_ids, minlength = n_points)
+
+	# vertices where two different lines meet with their first or last vertex
+	end_ids = np.append(starts, ends)
+	line_ids = np.append(np.arange(n_lines), np.arange(n_lines))
+	is_merge = (degree == 2) & \
+		(np.bincount(end_ids, minlength = n_points) == 2)
+	is_merge[starts[starts == ends]] = False
+	if not np.any(is_merge):
+		return offsets, point_ids
+
+	# the two lines at every merge id
+	order = np.argsort(end_ids, kind = 'stable')
+	order = order[is_merge[end_ids[order]]]
+	pair = np.full((n_points, 2), -1)
+	pair[end_ids[order[0::2]], 0] = line_ids[order[0::2]]
+	pair[end_ids[order[1::2]], 1] = line_ids[order[1::2]]
+	in_chain = is_merge[starts] | is_merge[ends]
+
+	# walk every chain, first from lines with an open end, then closed loops
+	visited = np.zeros(n_lines, dtype = bool)
+	chains = []
+	open_end = ~(is_merge[starts] & is_merge[ends])
+	for first in np.concatenate([np.flatnonzero(in_chain & open_end), \
+			np.flatnonzero(in_chain & ~open_end)]):
+		if visited[first]:
+			continue
+		entry = ends[first] if is_merge[starts[first]] and \
+			not is_merge[ends[first]] else starts[first]
+		chain = []
+		line = first
+		while line >= 0 and not visited[line]:
+			visited[line] = True
+			pids = point_ids[offsets[line]:offsets[line + 1]]
+			if pids[0] != entry:
+				pids = pids[::-1]
+			chain.append(pids if not chain else pids[1:])
+			entry = pids[-1]
+			if not is_merge[entry]:
+				break
+			line = pair[entry, 0] if pair[entry, 0] != line else pair[entry, 1]
+		chains.append(np.concatenate(chain))
+
+	# lines outside chains keep their order, merged lines are added after them
+	keep = np.flatnonzero(~in_chain)
+	lines = [point_ids[offsets[i]:offsets[i + 1]] for i in keep] + chains
+	sizes = np.array([len(line) for line in lines], dtype = int)
+	new_offsets = np.zeros(len(lines) + 1, dtype = int)
+	new_offsets[1:] = np.cumsum(sizes)
+	return new_offsets, np.concatenate(lines)
+
+def setLines(line_data, offsets, point_ids):
+	"""
+	Returns a copy of a skeleton graph with new lines.
+
+	Args:
+		line_data (vtk.vtkPolyData): skeleton graph
+		offsets (np.array, int): start of every line in point_ids (n_lines + 1)
+		point_ids (np.array, int): point IDs of all lines
+
+	Returns:
+		vtk.vtkPolyData: skeleton graph with the new lines
+	"""
+	cells = vtk.vtkCellArray()
+	cells.SetData(nps.numpy_to_vtkIdTypeArray(np.asarray(offsets, \
+			dtype = np.int64), deep = True), 
+		nps.numpy_to_vtkIdTypeArray(np.asarray(point_ids, dtype = np.int64), \
+			deep = True))
+
+	poly_new = vtk.vtkPolyData()
+	poly_new.DeepCopy(line_data)
+	poly_new.SetLines(cells)
+	return poly_new
+
+def pruneBranches(line_data, min_points = 4, min_length = None):
+	"""
+	Removes short terminal branches (spurs: branches with an end point, 
+	between an end point and a junction or unconnected, as 
+	deleteShortEndBranches) until no short spurs are left. Branches at a 
+	junction that is left with two branches are merged (see pruneLines). The
+	lines of the skeleton graph are rebuilt once.
+
+	Args:
+		line_data (vtk.vtkPolyData): skeleton graph
+		min_points (int): minimum number of vertices of a terminal branch
+		min_length (float): minimum length of a terminal branch, used instead 
+			of min_points if given
+
+	Returns:
+		vtk.vtkPolyData: skeleton graph without short terminal branches
+	"""
+	graph = getSkeletonGraph(line_data)
+	offsets, point_ids = pruneLines(graph.offsets, graph.point_ids, \
+		graph.points, min_points, min_length)
+	if np.array_equal(offsets, graph.offsets) and \
+			np.array_equal(point_ids, graph.point_ids):
+		return line_data
+	line_data = setLines(line_data, offsets, point_ids)
+	line_data = preprocessPolyData(line_data)
+	return line_data
+
+def pruneLines(offsets, point_ids, points, min_points = 4, min_length = None):
+	"""
+	Removes short spurs from lines until a fixed point is reached. Chains are 
+	merged first (see mergeChains). The vertex degrees are updated for every
+	removed spur, and only the lines at its junction are checked again: if
+	two lines are left there, they are merged and the merged line is checked.
+
+	Args:
+		offsets (np.array, int): start of every line in point_ids (n_lines + 1)
+		point_ids (np.array, int): point IDs of all lines
+		points (np.array, float): n_points x 3 vertex coordinates
+		min_points (int): minimum number of vertices of a spur
+		min_length (float): minimum length of a spur, used instead of 
+			min_points if given
+
+	Returns:
+		np.array (int): start of every remaining line in point_ids
+		np.array (int): point IDs of all remaining lines
+	"""
+	offsets, point_ids = mergeChains(offsets, point_ids, points.shape[0])
+	n_lines = len(offsets) - 1
+	lines = [point_ids[offsets[i]:offsets[i + 1]] for i in range(n_lines)]
+	alive = [True] * n_lines
+	degree = np.bincount(point_ids, minlength = points.shape[0])
+
+	# lines at the first and last vertex
+	end_lines = {}
+	for i, line in enumerate(lines):
+		for pid in {line[0], line[-1]}:
+			end_lines.setdefault(pid, []).append(i)
+
+	queue = deque(range(n_lines))
+	while queue:
+		i = queue.popleft()
+		line = lines[i]
+		if not alive[i] or not isShortSpur(line, degree, points, min_points, \
+				min_length):
+			continue
+
+		# remove spur
+		alive[i] = False
+		np.subtract.at(degree, line, 1)
+		for pid in {line[0], line[-1]}:
+			end_lines[pid].remove(i)
+		junc_id = line[0] if degree[line[0]] else line[-1]
+
+		# merge the two remaining lines at the junction
+		juncs = end_lines[junc_id]
+		if degree[junc_id] != 2 or len(juncs) != 2:
+			continue
+		merged = joinLines(lines[juncs[0]], lines[juncs[1]], junc_id)
+		for j in list(juncs):
+			alive[j] = False
+			for pid in {lines[j][0], lines[j][-1]}:
+				end_lines[pid].remove(j)
+		lines.append(merged)
+		alive.append(True)
+		for pid in {merged[0], merged[-1]}:
+			end_lines.setdefault(pid, []).append(len(lines) - 1)
+		queue.append(len(lines) - 1)
+
+	# remaining lines in order, merged lines are added after them
+	lines = [line for i, line in enumerate(lines) if alive[i]]
+	sizes = np.array([len(line) for line in lines], dtype = int)
+	new_offsets = np.zeros(len(lines) + 1, dtype = int)
+	new_offsets[1:] = np.cumsum(sizes)
+	if not lines:
+		return new_offsets, np.zeros(0, dtype = int)
+	return new_offsets, np.concatenate(lines)
+
+def isShortSpur(line, degree, points, min_points = 4, min_length = None):
+	"""
+	Returns whether a line is a short spur: at least one end is an end point
+	(d = 1) and it is shorter than the threshold. Unconnected lines (both 
+	ends d = 1) are spurs too, as in deleteShortEndBranches.
+
+	Args:
+		line (np.array, int): point IDs of the line
+		degree (np.array, int): number of lines that contain each vertex
+		points (np.array, float): n_points x 3 vertex coordinates
+		min_points (int): minimum number of vertices
+		min_length (float): minimum length, used instead of min_points if
+			given
+
+	Returns:
+		Bool: True if short spur, False otherwise
+	"""
+	if degree[line[0]] != 1 and degree[line[-1]] != 1:
+		return False
+	if min_length is None:
+		return len(line) < min_points
+	coords = points[line]
+	length = np.sum(np.sqrt(np.sum(np.diff(coords, axis = 0) ** 2, axis = 1)))
+	return length < min_length
+
+def joinLines(line0, line1, pid):
+	"""
+	Joins two lines that share their first or last vertex.
+
+	Args:
+		line0 (np.array, int): point IDs of the first line
+		line1 (np.array, int): point IDs of the second line
+		pid (int): shared vertex
+
+	Returns:
+		np.array (int): point IDs of the joined line
+	"""
+	if line0[-1] != pid:
+		line0 = line0[::-1]
+	if line1[0] != pid:
+		line1 = line1[::-1]
+	return np.concatenate([line0, line1[1:]])
+
 def deleteShortEndBranches(line_data, end_branches, min_points = 4):
 	in_cells = vtk.vtkIdList()
 	for br in end_branches:
@@ -104,31 +300,32 @@ def tryNewThickness(line_data, poly_data):
 	line_data.GetPointData().SetScalars(nps.numpy_to_vtk(medial_thickness))
 	return line_data
 
-def cleanBranches(line_data, min_end_br_length = 4):
+def cleanBranches(line_data, min_end_br_length = 4, min_end_br_dist = None):
 	
 	br = getJunctionEndPointIds(line_data)
 	end_br = br['end_branches']
 	end_p = br['end_points']	
 	line_data = reverseEndBranches(line_data, end_p, end_br)
-	line_data = deleteShortEndBranches(line_data, end_br, min_end_br_length)
-	line_data = mergeBranches(line_data)
+	line_data = pruneBranches(line_data, min_end_br_length, min_end_br_dist)
 	return line_data
 
 def cleanSkeleton(line_data, poly_data=None, change_thick = True, \
-		min_end_br_length = 4):
+		min_end_br_length = 4, min_end_br_dist = None):
 	"""
 	Clean skeleton graph: short terminal branches are removed and connecting 
-	branches are merged, end branch vertices are ordered (end point is point ID 
-	0 of cell). Medial thickness can be redefined. Unconnected components are
-	removed. 
+	branches are merged until no short terminal branches are left, end branch
+	vertices are ordered (end point is point ID 0 of cell). Medial thickness
+	can be redefined. Unconnected components are removed. Terminal branches
+	are short if they have less than min_end_br_length vertices or, if 
+	min_end_br_dist is given, if they are shorter than min_end_br_dist.
 	
 	"""
 
 	# remove 
-	line_data = cleanBranches(line_data, min_end_br_length)
+	line_data = cleanBranches(line_data, min_end_br_length, min_end_br_dist)
 	if change_thick:
 		line_data = tryNewThickness(line_data, poly_data)
-	line_data = preprocessPolyData(line_data, mm_to_cm = False)
+	line_data = preprocessPolyData(line_data)
 	br = getJunctionEndPointIds(line_data)
 
 	# somehow the end branches need to be reversed again
@@ -1,6 +1,7 @@
 import vtk
 import  vtk.util.numpy_support as nps 
 import numpy as np
+from scipy.sparse import csr_matrix
 
 class SkelVoxToGraph(vtk.vtkProgrammableFilter):
 	"""
@@ -34,139 +35,17 @@ class SkelVoxToGraph(vtk.vtkProgrammableFilter):
 		self.offs26_18 = []
 		self.gen_offsets(input)
 
-		tp = vtk.vtkThresholdPoints()
-		tp.SetInputData(input)
-		tp.ThresholdByUpper(-.5)
-		tp.Update()
-		# set the points of the output to be coordinates of the pixels that have a value of minimally 1
-		# (that is probably color)
-		output.SetPoints(tp.GetOutput().GetPoints())
-
-		tp.RemoveAllInputs()
-		del tp
-
-		# set all the scalars of the point data to be equal to the original id of the points
-		ids = vtk.vtkIdTypeArray()
-		thicks = vtk.vtkFloatArray()
-		ids.SetName('OriginalIds')
-		numPts = output.GetNumberOfPoints()
-		scal = input.GetPointData().GetScalars()
-		for i in range(numPts) :
-			id = input.FindPoint(output.GetPoint(i))
-			ids.InsertNextValue(id)
-			thickness = scal.GetComponent(id,0)
-			thicks.InsertNextValue(thickness)
-		thicks.SetName('MedialThickness')
-
-		output.GetPointData().SetScalars(ids)
-		del ids
+		# flat ids of the pixels that have a value of minimally -0.5 
+		# (the points of the skeleton graph, ordered by id)
+		scal = nps.vtk_to_numpy(input.GetPointData().GetScalars())
+		if scal.ndim > 1:
+			scal = scal[:,0]
+		ids = np.flatnonzero(scal >= -.5)
 
 		# build the skeleton graph
-		self.buildgraph(input, output,thicks)
-
-
-	def nbors(self, id, offs, scal, processed = []) :
-		good_nbors = []
-		for offset in offs :
-			nbor_id = id+offset
-
-			if (scal.GetComponent(nbor_id, 0) >= 0) :
-				good_nbors += [nbor_id]
-
-		return good_nbors
-
-
-	def existspath(self, source, dest, connmap) :
-
-		for cur_neigh in connmap[source]:
-			if dest in connmap[cur_neigh]:
-				return True
-
-		return False
-
-	def buildgraph(self, skelimage, skelpd,thicks) :
-		
-		# get the increments and the dimensions of the input data
-		inc = skelimage.GetIncrements()
-		dim = skelimage.GetDimensions()
-		ca = vtk.vtkCellArray()
-		
-		# obtian all the scalars of the input data
-		scal = skelimage.GetPointData().GetScalars()
-		# array of pdpointid -> imgpointid info
-
-		# get all the scalars of the output data
-		pointdata = skelpd.GetPointData()
-		skelptids = pointdata.GetScalars()
-		points = nps.vtk_to_numpy(skelpd.GetPoints().GetData())
-
-		vtk_points = vtk.vtkPoints()
-		vtk_points.SetData(nps.numpy_to_vtk(points))
-		skelpd.SetPoints(vtk_points)
-
-		pd2img = {}
-		img2pd = {}
-		connto = {}
-
-		# make a dictionaries to translate between the ids of the input and those of the output
-		for id in range(skelptids.GetNumberOfTuples()) :
-			pd2img[id] = skelptids.GetValue(id)
-			img2pd[skelptids.GetValue(id)] = id
-			connto[id] = []
-
-
-		numtup = skelptids.GetNumberOfTuples()
-		for offs in self.offs6, self.offs18_6, self.offs26_18 :
-			
-			for id in range(numtup) :
-				# obtain all the neighbours of the cell
-				nborlist = [img2pd[x] for x in self.nbors(pd2img[id], offs, scal)]
-				for nb in nborlist:
-					if not self.existspath(id, nb, connto) :
-						cl = connto[id]
-						if nb not in cl:
-							cl.append(nb)
-							cl.sort()
-						cl = connto[nb]
-						if id not in cl:
-							cl.append(id)
-							cl.sort()
-
-
-		
-		nonreg = [id for id,conns in connto.items() if len(conns) != 2]
-		finalpts = []
-		branches = []
-		startpoints = []
-		for startpt in nonreg :
-			for branchstart in connto[startpt] :
-				if branchstart not in finalpts and branchstart not in startpoints:
-
-					branch = [startpt, branchstart]
-					curpt = branchstart
-					while len(connto[curpt]) == 2:
-						curpt = connto[curpt]
-						if curpt[0] in branch:
-							curpt = curpt[1]
-						else :
-							curpt = curpt[0]
-						if curpt in branch and curpt != branch[0] :
-							break
-						branch.append(curpt)
-					finalpts.append(branch[-2])
-					branches.append(branch)
-			startpoints.append(startpt)
-
-		outca = vtk.vtkCellArray()
-		for branch in branches :
-			outca.InsertNextCell(len(branch))
-			for point in branch :
-				outca.InsertCellPoint(point)
-
-		pointdata.SetScalars(thicks)
-		skelpd.SetLines(outca)
-		del ca
-		del outca
+		offsets = [self.offs6, self.offs18_6, self.offs26_18]
+		output.ShallowCopy(voxelsToGraph(ids, scal[ids], input.GetDimensions(),
+			input.GetOrigin(), input.GetSpacing(), offsets))
 
 	def gen_offsets(self, img) :
 		"""
@@ -198,4 +77,186 @@ class SkelVoxToGraph(vtk.vtkProgrammableFilter):
 					if (dist == 3) :
 						self.offs26_18 += [offset]
 					if (dist <= 3):
-						self.offs26 += [offset]
\ No newline at end of file
+						self.offs26 += [offset]
+
+def voxelsToGraph(ids, values, dims, origin, spacing, offsets = None):
+	"""
+	Makes a skeleton graph of the points of a voxel skeleton. Neighbouring
+	points (6, then 18 and 26 neighbours) are connected unless they are 
+	already connected through a common neighbour (see getVoxelAdjacency) and
+	every chain of points with two connections is a line (see walkBranches).
+
+	Args:
+		ids (np.array, int): sorted flat ids of the points in the image
+		values (np.array, float): pixel values (medial thickness) of the
+			points, only points with a value of minimally 0 are neighbours
+		dims (list, int): dimensions of the image
+		origin (list, float): origin of the image
+		spacing (list, float): spacing of the image
+		offsets (list): flat id offsets of the 6, 18 and 26 neighbours (see 
+			getNeighbourOffsets)
+
+	Returns:
+		vtk.vtkPolyData: skeleton graph with MedialThickness scalars
+	"""
+	if offsets is None:
+		offsets = getNeighbourOffsets(dims)
+	offsets = [np.asarray(offs, dtype = int) for offs in offsets]
+	skelpd = vtk.vtkPolyData()
+
+	# coordinates of the pixels
+	ijk = np.column_stack(np.unravel_index(ids, tuple(dims[::-1]))[::-1])
+	coords = np.asarray(origin) + ijk * np.asarray(spacing)
+	vtk_points = vtk.vtkPoints()
+	vtk_points.SetData(nps.numpy_to_vtk(coords.astype(np.float32), deep = True))
+	skelpd.SetPoints(vtk_points)
+
+	thicks = nps.numpy_to_vtk(np.asarray(values, dtype = np.float32), \
+		deep = True)
+	thicks.SetName('MedialThickness')
+
+	# connect the points and walk the branches
+	adj_offsets, adj_ids = getVoxelAdjacency(ids, values, offsets)
+	branches = walkBranches(adj_offsets, adj_ids)
+
+	sizes = np.array([len(branch) for branch in branches], dtype = np.int64)
+	cell_offsets = np.zeros(len(branches) + 1, dtype = np.int64)
+	cell_offsets[1:] = np.cumsum(sizes)
+	conn = np.zeros(0, dtype = np.int64)
+	if branches:
+		conn = np.concatenate(branches).astype(np.int64)
+	outca = vtk.vtkCellArray()
+	outca.SetData(nps.numpy_to_vtkIdTypeArray(cell_offsets, deep = True), 
+		nps.numpy_to_vtkIdTypeArray(conn, deep = True))
+
+	skelpd.GetPointData().SetScalars(thicks)
+	skelpd.SetLines(outca)
+	return skelpd
+
+def getNeighbourOffsets(dims):
+	"""
+	Obtains the flat id offsets of the 6 neighbours, the other 18 neighbours
+	and the other 26 neighbours of a pixel (as SkelVoxToGraph.gen_offsets).
+
+	Args:
+		dims (list, int): dimensions of the image
+
+	Returns:
+		list: arrays of offsets (6, 18 - 6 and 26 - 18 neighbours)
+	"""
+	inc = [1, dims[0], dims[0] * dims[1]]
+	offsets = [[], [], []]
+	for x in range(-1, 2) :
+		for y in range(-1, 2) :
+			for z in range(-1, 2) :
+				dist = x*x + y*y + z*z
+				if dist:
+					offsets[dist - 1].append(x*inc[0] + y*inc[1] + z*inc[2])
+	return [np.asarray(offs, dtype = int) for offs in offsets]
+
+def getVoxelAdjacency(ids, values, offsets):
+	"""
+	Obtains the connections between the points of a voxel skeleton. The 
+	neighbours of all points are found at once by looking up id + offset in
+	the sorted ids. The offsets are added per group (6, 18 and 26 neighbours)
+	and a neighbour is only connected if the two points have no common 
+	neighbour yet. Only connections that are part of a triangle are checked
+	one by one, in the order of the points and offsets.
+
+	Args:
+		ids (np.array, int): sorted flat ids of the points in the image
+		values (np.array, float): pixel values of the points, only points
+			with a value of minimally 0 are neighbours
+		offsets (list): arrays of flat id offsets of every group of neighbours
+
+	Returns:
+		np.array (int): start of the neighbours of every point (n_points + 1)
+		np.array (int): neighbours of all points (sorted per point)
+	"""
+	n_points = len(ids)
+	is_nbor = (values >= 0)
+	adjacency = csr_matrix((n_points, n_points), dtype = np.int8)
+	for offs in offsets:
+		n_offs = len(offs)
+
+		# neighbours of all points, in the order they are visited
+		src = np.repeat(np.arange(n_points), n_offs)
+		nbor_ids = ids[src] + np.tile(offs, n_points)
+		pos = np.minimum(np.searchsorted(ids, nbor_ids), n_points - 1)
+		found = (ids[pos] == nbor_ids) & is_nbor[pos]
+		src, dst = src[found], pos[found]
+
+		# every connection once, at its first visit
+		low, high = np.minimum(src, dst), np.maximum(src, dst)
+		_, first = np.unique(low * n_points + high, return_index = True)
+		first = np.sort(first)
+		low, high = low[first], high[first]
+		if not len(low):
+			continue
+
+		# connections that are not part of a triangle are always made
+		cand = csr_matrix((np.ones(2 * len(low), dtype = np.int8), 
+			(np.append(low, high), np.append(high, low))), 
+			shape = (n_points, n_points))
+		graph = adjacency + cand
+		in_triangle = np.asarray(graph.dot(graph).multiply(cand)[low, high])
+		in_triangle = in_triangle.ravel() > 0
+
+		# other connections are made if there is no common neighbour yet
+		add = ~in_triangle
+		connto = {}
+		for i in np.flatnonzero(in_triangle):
+			for pid in (low[i], high[i]):
+				if pid not in connto:
+					connto[pid] = set(adjacency.indices[
+						adjacency.indptr[pid]:adjacency.indptr[pid + 1]])
+			if connto[low[i]].isdisjoint(connto[high[i]]):
+				connto[low[i]].add(high[i])
+				connto[high[i]].add(low[i])
+				add[i] = True
+
+		adjacency = adjacency + csr_matrix((np.ones(2 * np.sum(add), 
+			dtype = np.int8), (np.append(low[add], high[add]), 
+			np.append(high[add], low[add]))), shape = (n_points, n_points))
+
+	adjacency.sort_indices()
+	return adjacency.indptr, adjacency.indices
+
+def walkBranches(adj_offsets, adj_ids):
+	"""
+	Makes branches of all chains of points with two connections, starting at
+	every point with another number of connections (in order of point id).
+	Every branch is walked once, the branches of closed chains without such
+	points are not included.
+
+	Args:
+		adj_offsets (np.array, int): start of the neighbours of every point
+		adj_ids (np.array, int): neighbours of all points (sorted per point)
+
+	Returns:
+		list: point ids of every branch
+	"""
+	degree = np.diff(adj_offsets)
+	adj_offsets = adj_offsets.tolist()
+	adj_ids = adj_ids.tolist()
+	finalpts = set()
+	startpoints = set()
+	branches = []
+	for startpt in np.flatnonzero(degree != 2).tolist():
+		for branchstart in adj_ids[adj_offsets[startpt]:adj_offsets[startpt+1]]:
+			if branchstart in finalpts or branchstart in startpoints:
+				continue
+			branch = [startpt, branchstart]
+			in_branch = {startpt, branchstart}
+			curpt = branchstart
+			while degree[curpt] == 2:
+				nb0, nb1 = adj_ids[adj_offsets[curpt]:adj_offsets[curpt] + 2]
+				curpt = nb1 if nb0 in in_branch else nb0
+				if curpt in in_branch and curpt != startpt:
+					break
+				branch.append(curpt)
+				in_branch.add(curpt)
+			finalpts.add(branch[-2])
+			branches.append(branch)
+		startpoints.add(startpt)
+	return branches
@@ -1,5 +1,5 @@
 import vtk
-import getJunctionEndPointIds
+from ..basic_skeleton_measures import getJunctionEndPointIds
 
 import numpy as np
 import vtk.util.numpy_support as nps
@@ -2,6 +2,7 @@ import vtk
 import numpy as np
 import math as m
 import vtk.util.numpy_support as nps 
+from polygon_mesh_based.mesh_operator import MeshOperator
 
 
 def smoothPolyData(poly_data, max_iter = 100, passband = 0.005):
@@ -13,39 +14,81 @@ def smoothPolyData(poly_data, max_iter = 100, passband = 0.005):
 	smooth_filter.Update()
 	return smooth_filter.GetOutput()
 
+def smoothPolyDataImplicit(poly_data, step = 0.001, n_iter = 10, operator = None):
+	"""
+	Smooths a polygon mesh by implicit diffusion of the vertex coordinates 
+	with the cotangent Laplacian (see MeshOperator.smoothPoints). The
+	factorization of the system is reused for every iteration and can be
+	shared with other measures through the operator.
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		step (float): time step of every iteration (in squared mesh units)
+		n_iter (int): number of iterations
+		operator (MeshOperator): operators of poly_data, built if not given
+
+	Returns:
+		vtk.vtkPolyData: smoothed polygon mesh
+	"""
+	if operator is None:
+		operator = MeshOperator.fromPolyData(poly_data)
+	points = vtk.vtkPoints()
+	points.SetData(nps.numpy_to_vtk(operator.smoothPoints(step, n_iter), deep = 1))
 
-def voxelizePolyData(poly_data, spacing = .05, tolerance=0):
+	poly_smooth = vtk.vtkPolyData()
+	poly_smooth.ShallowCopy(poly_data)
+	poly_smooth.SetPoints(points)
+	return poly_smooth
+
+
+def voxelizePolyData(poly_data, spacing = .05, tolerance=0, lean = False, \
+		return_runs = False, extent = None, origin = None):
 	"""
-	Transforms a polygon mesh into a voxel image
+	Transforms a polygon mesh into a voxel image (255 inside, 0 outside).
 
 	Args:
 		poly_data (vtk.vtkPolyData): closed polygon mesh
-		spacing (float
+		spacing (float or list): voxel size (in every direction)
+		tolerance (float): tolerance of vtkPolyDataToImageStencil
+		lean (bool): write the stencil directly into an unsigned char image 
+			instead of cutting a dense float image (same voxels, 1 byte per 
+			voxel)
+		return_runs (bool): also return the foreground voxels as runs (see
+			getImageRuns)
+		extent (list, int): first and last voxel index along every axis of a
+			part of the voxel grid of the mesh (see getVoxelGrid) to voxelize,
+			the image then starts at the first voxel of extent
+		origin (list, float): origin of the voxel grid that extent refers to
+			(defaults to the origin of the voxel grid of the mesh, e.g. if the
+			mesh is a clipped part of a larger mesh)
+
+	Returns:
+		vtk.vtkImageData: voxel image
+		Dict: runs of foreground voxels (only if return_runs)
 	"""
 	if isinstance(spacing,float) or isinstance(spacing, int):
 		spacing = [spacing] * 3
 	
 	# Get some basic info of poly data
-	poly_bounds = np.asarray(poly_data.GetBounds())
-	min_bounds = poly_bounds[::2]
-	max_bounds = poly_bounds[1::2]
+	min_bounds, dims = getVoxelGrid(poly_data, spacing)
+	if origin is not None:
+		min_bounds = np.asarray(origin, dtype = float)
+	if extent is not None:
+		extent = np.asarray(extent)
+		min_bounds = min_bounds + extent[::2] * np.asarray(spacing)
+		dims = extent[1::2] - extent[::2] + 1
 
 	# Prepare image to cut in
 	white_img = vtk.vtkImageData()
 	white_img.SetSpacing(spacing)
 
-	dims = np.asarray([m.ceil((max_bounds[i]-min_bounds[i])/spacing[i]) + 1 for i in range(3)])
 	white_img.SetDimensions(dims)
 	ext = dims -1
 	white_img.SetExtent(0, ext[0], 0, ext[1], 0, ext[2])
 	white_img.SetOrigin(min_bounds)
-	white_img.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 1)
 
 	in_val = 255
 	out_val = 0
-	n_pix = white_img.GetNumberOfPoints()
-	in_val_array = np.ones(n_pix) * in_val
-	white_img.GetPointData().SetScalars(nps.numpy_to_vtk(in_val_array))
 	
 	# Make an image stencil of the polydata
 	stencil_filter = vtk.vtkPolyDataToImageStencil()
@@ -56,15 +99,102 @@ def voxelizePolyData(poly_data, spacing = .05, tolerance=0):
 	stencil_filter.SetOutputWholeExtent(white_img.GetExtent())
 	stencil_filter.Update()
 
-	# cut the image
-	img_stencil = vtk.vtkImageStencil()
-	img_stencil.SetInputData(white_img)
-	img_stencil.SetStencilConnection(stencil_filter.GetOutputPort())
-	img_stencil.ReverseStencilOff()
-	img_stencil.SetBackgroundValue(out_val)
-	img_stencil.Update()
+	if lean:
+		# write the stencil into an unsigned char image
+		stencil_img = vtk.vtkImageStencilToImage()
+		stencil_img.SetInputConnection(stencil_filter.GetOutputPort())
+		stencil_img.SetInsideValue(in_val)
+		stencil_img.SetOutsideValue(out_val)
+		stencil_img.SetOutputScalarTypeToUnsignedChar()
+		stencil_img.Update()
+		vox_img = stencil_img.GetOutput()
+	else:
+		white_img.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 1)
+		n_pix = white_img.GetNumberOfPoints()
+		in_val_array = np.ones(n_pix) * in_val
+		white_img.GetPointData().SetScalars(nps.numpy_to_vtk(in_val_array))
+
+		# cut the image
+		img_stencil = vtk.vtkImageStencil()
+		img_stencil.SetInputData(white_img)
+		img_stencil.SetStencilConnection(stencil_filter.GetOutputPort())
+		img_stencil.ReverseStencilOff()
+		img_stencil.SetBackgroundValue(out_val)
+		img_stencil.Update()
+		vox_img = img_stencil.GetOutput()
+
+	if return_runs:
+		return vox_img, getImageRuns(vox_img)
+	return vox_img
+
+def getVoxelGrid(poly_data, spacing = .05):
+	"""
+	Obtains the voxel grid of a polygon mesh: the grid starts at the minimum 
+	bounds of the mesh and covers its bounding box.
+
+	Args:
+		poly_data (vtk.vtkPolyData): closed polygon mesh
+		spacing (list, float): voxel size in every direction
+
+	Returns:
+		np.array (float): origin of the grid
+		np.array (int): dimensions of the grid
+	"""
+	if isinstance(spacing,float) or isinstance(spacing, int):
+		spacing = [spacing] * 3
+	poly_bounds = np.asarray(poly_data.GetBounds())
+	min_bounds = poly_bounds[::2]
+	max_bounds = poly_bounds[1::2]
+	dims = np.asarray([m.ceil((max_bounds[i]-min_bounds[i])/spacing[i]) + 1 for i in range(3)])
+	return min_bounds, dims
+
+def getImageRuns(image_data):
+	"""
+	Obtains the foreground voxels (value > 0) of a voxel image as runs along 
+	the x-axis, processed per slice of the (zero-copy) image array.
 
-	return img_stencil.GetOutput()
+	Args:
+		image_data (vtk.vtkImageData): voxel image
+
+	Returns:
+		Dict: dictionary with keys
+			- dims: dimensions of the image (np.array, int)
+			- rows: row of every run, y + z * dims[1] (np.array, int)
+			- starts: first x index of every run (np.array, int)
+			- stops: last x index + 1 of every run (np.array, int)
+	"""
+	dims = np.asarray(image_data.GetDimensions())
+	vox = nps.vtk_to_numpy(image_data.GetPointData().GetScalars())
+	vox = vox.reshape(dims[2], dims[1], dims[0])
+	rows, starts, stops = [], [], []
+	for z in range(dims[2]):
+		# run starts and stops are where the foreground changes along x
+		fg = np.zeros((dims[1], dims[0] + 2), dtype = np.int8)
+		fg[:,1:-1] = (vox[z] > 0)
+		change = np.diff(fg, axis = 1)
+		row, start = np.nonzero(change == 1)
+		stops.append(np.nonzero(change == -1)[1])
+		rows.append(row + z * dims[1])
+		starts.append(start)
+	return {'dims': dims, 'rows': np.concatenate(rows), 
+		'starts': np.concatenate(starts), 'stops': np.concatenate(stops)}
+
+def getRunVoxelIds(runs):
+	"""
+	Obtains the flat ids (x + dims[0] * (y + dims[1] * z)) of all foreground 
+	voxels of image runs.
+
+	Args:
+		runs (dict): runs of foreground voxels (see getImageRuns)
+
+	Returns:
+		np.array (int): sorted flat ids of the foreground voxels
+	"""
+	lengths = runs['stops'] - runs['starts']
+	first = runs['rows'] * runs['dims'][0] + runs['starts']
+	pos = np.arange(np.sum(lengths)) - np.repeat(np.cumsum(lengths) - lengths,
+		lengths)
+	return np.repeat(first, lengths) + pos
 
 # def saveVoxelize(poly_data, coralname, out_dir = vtk.DIR_IMG, spacing = .05):
 # 	print('omw')
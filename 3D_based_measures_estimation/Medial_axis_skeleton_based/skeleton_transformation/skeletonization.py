@@ -1,5 +1,18 @@
 import vtk 
-from pre_skel import *
+import os
+import glob
+import shutil
+import tempfile
+import time
+import subprocess
+import numpy as np
+import vtk.util.numpy_support as nps
+from multiprocessing import Pool
+from scipy.spatial import cKDTree
+from .pre_skel import *
+from .extract_lines import SkelVoxToGraph, voxelsToGraph
+from helpers import local_directories as ldir
+from helpers.load_data import readMHD, writeMHD, readVTK, writeVTK
 
 def makeVoxelSkeleton(in_dir, filename):
 	
@@ -9,7 +22,7 @@ def makeVoxelSkeleton(in_dir, filename):
 	
 	return voxel_skel
 
-def skeletonize(poly_data, spacing = .05, skel_dir = vtk.DIR_TEMP):
+def skeletonize(poly_data, spacing = .05, skel_dir = ldir.TEMP):
 	"""
 	
 	"""
@@ -28,9 +41,287 @@ def skeletonize(poly_data, spacing = .05, skel_dir = vtk.DIR_TEMP):
 	voxel_skel = makeVoxelSkeleton(skel_dir, fn)
 
 	# make a VTK line object of voxel skeleton
-	sg = SkelGraph()
+	sg = SkelVoxToGraph()
 	sg.SetInputData(voxel_skel)
 	
 	sg.Update()
 	return sg.GetOutput()
 
+def skeletonizeTiled(poly_data, spacing = .05, skel_dir = ldir.TEMP, \
+		tile_size = 256, overlap = 16, n_workers = None, bridge = 3):
+	"""
+	Skeletonizes a polygon mesh in tiles, such that the memory of every worker
+	is bounded by the tile size. The voxel grid of the mesh is divided in
+	tiles of tile_size voxels (the core of the tile) extended with overlap
+	voxels on every side. The mesh is clipped to every tile (see 
+	clipTileMesh) and written once per tile, such that every worker only 
+	reads, voxelizes and skeletonizes the part of the mesh in its tile (in 
+	parallel). The skeleton voxels in the core of every tile are combined
+	and the skeleton graph is made of all skeleton voxels at once (see
+	extract_lines.voxelsToGraph). Gaps in the skeleton at the borders between
+	tiles are bridged (see bridgeSeams).
+
+	NOTE: overlap should be larger than the largest radius of the branches
+	(in voxels), such that the thinning and medial thickness near the core of
+	a tile are not affected by the border of the tile.
+
+	Args:
+		poly_data (vtk.vtkPolyData): closed polygon mesh
+		spacing (float): voxel size
+		skel_dir (str): directory in which a temporary directory for the
+			meshes, voxel images and voxel skeletons of the tiles is made (and
+			removed afterwards)
+		tile_size (int): number of voxels in the core of a tile (every axis)
+		overlap (int): number of voxels added on every side of the core
+		n_workers (int): number of worker processes (defaults to the number
+			of cores)
+		bridge (float): largest gap (in voxels) between skeleton end voxels
+			and skeleton voxels of another tile that is bridged
+
+	Returns:
+		vtk.vtkPolyData: skeleton graph with MedialThickness scalars
+	"""
+	if isinstance(spacing,float) or isinstance(spacing, int):
+		spacing = [spacing] * 3
+
+	#smooth poly_data
+	poly_data = smoothPolyData(poly_data)
+	origin, dims = getVoxelGrid(poly_data, spacing)
+	tiles = getTiles(dims, tile_size, overlap)
+
+	# the workers read the mesh of their tile from a directory of this call
+	# only, tiles without mesh are skipped
+	tile_dir = tempfile.mkdtemp(prefix = 'tiles_', dir = skel_dir)
+	try:
+		tasks = []
+		for i, (extent, core) in enumerate(tiles):
+			tile_mesh = clipTileMesh(poly_data, extent, origin, spacing)
+			if not tile_mesh.GetNumberOfCells():
+				continue
+			writeVTK(f"mesh_{i}", tile_mesh, tile_dir)
+			del tile_mesh
+			tasks.append((i, extent, core, dims, origin, spacing, tile_dir))
+		del poly_data
+		with Pool(n_workers) as pool:
+			results = pool.map(skeletonizeTile, tasks)
+	finally:
+		shutil.rmtree(tile_dir, ignore_errors = True)
+
+	# combine the skeleton voxels of all tiles (the cores do not overlap)
+	ids = np.concatenate([res[0] for res in results])
+	values = np.concatenate([res[1] for res in results])
+	order = np.argsort(ids)
+	ids, values = ids[order], values[order]
+
+	ids, values = bridgeSeams(ids, values, dims, tile_size, bridge)
+	return voxelsToGraph(ids, values, dims, origin, spacing)
+
+def getTiles(dims, tile_size = 256, overlap = 16):
+	"""
+	Divides a voxel grid in tiles.
+
+	Args:
+		dims (np.array, int): dimensions of the voxel grid
+		tile_size (int): number of voxels in the core of a tile (every axis)
+		overlap (int): number of voxels added on every side of the core
+
+	Returns:
+		list: tuples of the extent (first and last voxel along every axis, as
+			vtkImageData.GetExtent) and the core (first and last + 1 voxel
+			along every axis) of every tile
+	"""
+	starts = [np.arange(0, dims[i], tile_size) for i in range(3)]
+	tiles = []
+	for k in starts[2]:
+		for j in starts[1]:
+			for i in starts[0]:
+				core = np.array([i, j, k])
+				core_stop = np.minimum(core + tile_size, dims)
+				first = np.maximum(core - overlap, 0)
+				last = np.minimum(core_stop + overlap, dims) - 1
+				extent = np.column_stack([first, last]).ravel()
+				tiles.append((extent, np.column_stack([core, core_stop]).ravel()))
+	return tiles
+
+def clipTileMesh(poly_data, extent, origin, spacing, margin = 2):
+	"""
+	Clips a closed polygon mesh to the box of a tile extended with margin 
+	voxels on every side. The clipped mesh is closed again at the sides of 
+	the box (vtkClipClosedSurface), such that it is voxelized the same as the
+	whole mesh within the extent of the tile.
+
+	Args:
+		poly_data (vtk.vtkPolyData): closed polygon mesh
+		extent (np.array, int): first and last voxel of the tile along every
+			axis
+		origin (np.array, float): origin of the voxel grid of the mesh
+		spacing (list, float): voxel size in every direction
+		margin (float): number of voxels added on every side of the box
+
+	Returns:
+		vtk.vtkPolyData: closed polygon mesh of the tile (without faces if 
+			the mesh is not in the tile)
+	"""
+	spacing = np.asarray(spacing, dtype = float)
+	low = np.asarray(origin) + (extent[::2] - margin) * spacing
+	high = np.asarray(origin) + (extent[1::2] + margin) * spacing
+
+	# clip at the sides of the box one by one (with normals pointing inwards),
+	# as clipping at all planes at once can leave the mesh open
+	tile_mesh = poly_data
+	for i in range(3):
+		for point, sign in [(low, 1), (high, -1)]:
+			if not tile_mesh.GetNumberOfCells():
+				return tile_mesh
+
+			# planes outside the bounds of the mesh do not clip it
+			bounds = tile_mesh.GetBounds()
+			if (sign > 0 and point[i] <= bounds[2*i]) or \
+					(sign < 0 and point[i] >= bounds[2*i + 1]):
+				continue
+			normal = [0, 0, 0]
+			normal[i] = sign
+			plane = vtk.vtkPlane()
+			plane.SetOrigin(point)
+			plane.SetNormal(normal)
+			planes = vtk.vtkPlaneCollection()
+			planes.AddItem(plane)
+
+			clipper = vtk.vtkClipClosedSurface()
+			clipper.SetInputData(tile_mesh)
+			clipper.SetClippingPlanes(planes)
+			clipper.Update()
+			tile_mesh = clipper.GetOutput()
+	return tile_mesh
+
+def skeletonizeTile(task):
+	"""
+	Voxelizes and skeletonizes a tile of the voxel grid from the clipped 
+	mesh of the tile in tile_dir (see skeletonizeTiled).
+
+	Args:
+		task (tuple): tile number, extent, core, dimensions and origin of the
+			voxel grid, spacing and tile_dir
+
+	Returns:
+		np.array (int): sorted flat ids (in the voxel grid) of the skeleton
+			voxels in the core of the tile
+		np.array (float): medial thickness of the skeleton voxels
+	"""
+	tile_id, extent, core, dims, origin, spacing, tile_dir = task
+	poly_data = readVTK(f"mesh_{tile_id}", tile_dir)
+	vox_img = voxelizePolyData(poly_data, spacing, lean = True,
+		extent = extent, origin = origin)
+	del poly_data
+	if not np.any(nps.vtk_to_numpy(vox_img.GetPointData().GetScalars())):
+		return np.zeros(0, dtype = int), np.zeros(0, dtype = np.float32)
+
+	fn = f"vox_{tile_id}"
+	writeMHD(fn, vox_img, tile_dir)
+	del vox_img
+	voxel_skel = makeVoxelSkeleton(tile_dir, fn)
+
+	# remove the voxel image and voxel skeleton of the tile
+	for name in glob.glob(f"{tile_dir}/{fn}.*") + \
+			glob.glob(f"{tile_dir}/{fn}_skel.*"):
+		os.remove(name)
+	return getTileVoxels(voxel_skel, extent, core, dims)
+
+def getTileVoxels(voxel_skel, extent, core, dims):
+	"""
+	Obtains the skeleton voxels (value of minimally -0.5, as SkelVoxToGraph)
+	of a voxel skeleton of a tile that are in the core of the tile.
+
+	Args:
+		voxel_skel (vtk.vtkImageData): voxel skeleton of the tile
+		extent (np.array, int): first and last voxel of the tile along every
+			axis
+		core (np.array, int): first and last + 1 voxel of the core along
+			every axis
+		dims (np.array, int): dimensions of the voxel grid
+
+	Returns:
+		np.array (int): sorted flat ids (in the voxel grid) of the skeleton
+			voxels in the core of the tile
+		np.array (float): values of these voxels
+	"""
+	scal = nps.vtk_to_numpy(voxel_skel.GetPointData().GetScalars())
+	if scal.ndim > 1:
+		scal = scal[:,0]
+	tile_dims = extent[1::2] - extent[::2] + 1
+	local_ids = np.flatnonzero(scal >= -.5)
+
+	# voxel indices in the grid
+	ijk = np.column_stack(np.unravel_index(local_ids, tuple(tile_dims[::-1]))[::-1])
+	ijk += extent[::2]
+	in_core = np.all((ijk >= core[::2]) & (ijk < core[1::2]), axis = 1)
+	ijk = ijk[in_core]
+	ids = np.ravel_multi_index(tuple(ijk[:,::-1].T), tuple(dims[::-1]))
+	return ids, scal[local_ids[in_core]]
+
+def bridgeSeams(ids, values, dims, tile_size, bridge = 3):
+	"""
+	Bridges gaps in a voxel skeleton at the borders between tiles: every end
+	voxel (at most one 26 neighbour) near a border is connected to the
+	closest skeleton voxel of another tile within bridge voxels with a
+	straight line of voxels, unless it already has a neighbour in another
+	tile. The medial thickness of the added voxels is interpolated.
+
+	Args:
+		ids (np.array, int): sorted flat ids of the skeleton voxels
+		values (np.array, float): medial thickness of the skeleton voxels
+		dims (np.array, int): dimensions of the voxel grid
+		tile_size (int): number of voxels in the core of a tile
+		bridge (float): largest gap (in voxels) that is bridged
+
+	Returns:
+		np.array (int): sorted flat ids of the skeleton voxels
+		np.array (float): medial thickness of the skeleton voxels
+	"""
+	if not len(ids) or bridge <= 0:
+		return ids, values
+	ijk = np.column_stack(np.unravel_index(ids, tuple(dims[::-1]))[::-1])
+	tile = ijk // tile_size
+
+	# number of 26 neighbours and neighbours in another tile of every voxel
+	tree = cKDTree(ijk)
+	pairs = tree.query_pairs(np.sqrt(3), output_type = 'ndarray')
+	n_nbors = np.bincount(pairs.ravel(), minlength = len(ids))
+	cross = np.any(tile[pairs[:,0]] != tile[pairs[:,1]], axis = 1)
+	has_cross = np.zeros(len(ids), dtype = bool)
+	has_cross[pairs[cross].ravel()] = True
+
+	# end voxels near a border between tiles, on the low side (start of a
+	# tile that is not the first) or the high side (end of a tile that is
+	# not the last) of the border
+	pos = ijk % tile_size
+	near_low = (pos < bridge) & (ijk >= tile_size)
+	near_high = (tile_size - 1 - pos < bridge) & \
+		((tile + 1) * tile_size < dims)
+	near = np.any(near_low | near_high, axis = 1)
+	ends = np.flatnonzero((n_nbors <= 1) & near & ~has_cross)
+
+	new_ijk, new_values = [], []
+	for end in ends:
+		nbors = np.asarray(tree.query_ball_point(ijk[end], bridge), dtype = int)
+		nbors = nbors[np.any(tile[nbors] != tile[end], axis = 1)]
+		if not len(nbors):
+			continue
+		dist = np.sum((ijk[nbors] - ijk[end]) ** 2, axis = 1)
+		target = nbors[np.argmin(dist)]
+
+		# straight line of voxels between end voxel and target
+		n_steps = np.max(np.abs(ijk[target] - ijk[end]))
+		frac = np.arange(1, n_steps) / n_steps
+		new_ijk.append(np.rint(ijk[end] + frac[:,None] * \
+			(ijk[target] - ijk[end])).astype(int))
+		new_values.append(values[end] + frac * (values[target] - values[end]))
+	if not new_ijk:
+		return ids, values
+
+	new_ijk = np.concatenate(new_ijk)
+	new_ids = np.ravel_multi_index(tuple(new_ijk[:,::-1].T), tuple(dims[::-1]))
+	ids = np.append(ids, new_ids)
+	values = np.append(values, np.concatenate(new_values).astype(values.dtype))
+	ids, first = np.unique(ids, return_index = True)
+	return ids, values[first]
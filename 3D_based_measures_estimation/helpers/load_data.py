@@ -26,7 +26,7 @@ def readIntoVTK(reader, file_name, input_dir, suffix = 'vtk'):
 
 
 
-def readMHD(file_name, input_dir = ldir.DIR_IMG):
+def readMHD(file_name, input_dir = ldir.IMG):
 	"""
 	Reader reads metaimage into vtkImageData object
 
@@ -52,7 +52,7 @@ def writeFromVTK(writer,file_name, data,output_dir,suffix):
 	writer.Write()
 
 
-def writeVTK(file_name, poly_data, output_dir = ldir.DIR_POLYDATA,suffix=""):
+def writeVTK(file_name, poly_data, output_dir = ldir.POLYDATA,suffix=""):
 	"""
 	Writer writes VTK-file (.vtk) of a vtkPolyData object
 	
@@ -73,7 +73,7 @@ def writeVTK(file_name, poly_data, output_dir = ldir.DIR_POLYDATA,suffix=""):
 	writerVTK = vtk.vtkPolyDataWriter()
 	writeFromVTK(writerVTK, file_name, poly_data, output_dir, 'vtk')
 
-def writeMHD(file_name, image_data, output_dir = ldir.DIR_IMG):
+def writeMHD(file_name, image_data, output_dir = ldir.IMG):
 	"""
 	Writer writes meta image header (.MHD) and corresponding image (.zraw) of a
 	vtkImageData object
@@ -93,7 +93,7 @@ def writeMHD(file_name, image_data, output_dir = ldir.DIR_IMG):
 	writerMHD = vtk.vtkMetaImageWriter()
 	writeFromVTK(writerMHD, file_name, image_data, output_dir, 'mhd')
 
-def writePNG(file_name, image, output_dir = ldir.DIR_PHOTO):
+def writePNG(file_name, image, output_dir = ldir.PHOTO):
 	"""
 	Writes picture (.png)
 
@@ -115,7 +115,7 @@ def writePNG(file_name, image, output_dir = ldir.DIR_PHOTO):
 
 #### CSV readers and writers
 ## readers
-def readCSVAsDict(file_name, in_dir = ldir.DIR_RESULTS):
+def readCSVAsDict(file_name, in_dir = ldir.RESULTS):
 	"""
 	Loads csv-file as dictionary, where column 'id' is the key and 
 	the value is the other headers as key-value pairs
@@ -145,7 +145,7 @@ def readCSVAsDict(file_name, in_dir = ldir.DIR_RESULTS):
 
 
 
-def writeDictAsCSV(measure_dict, file_name, outdir = ldir.DIR_RESULTS):
+def writeDictAsCSV(measure_dict, file_name, outdir = ldir.RESULTS):
 	with open(f'{outdir}/{file_name}.csv', mode = 'w') as writefile:
 		for key in measure_dict:
 			headers = measure_dict[key].keys()
@@ -160,11 +160,11 @@ def writeDictAsCSV(measure_dict, file_name, outdir = ldir.DIR_RESULTS):
 			writer.writerow(measures)
 
 
-def writePickle(measure_dict, file_name, output_dir = ldir.DIR_RESULTS):
+def writePickle(measure_dict, file_name, output_dir = ldir.RESULTS):
 	with open(f'{output_dir}/{file_name}.pickle', 'wb') as handle:
     	 pickle.dump(measure_dict, handle)
 
-def readPickle(file_name, input_dir = ldir.DIR_RESULTS):
+def readPickle(file_name, input_dir = ldir.RESULTS):
 	with open(f"{input_dir}/{file_name}.pickle", 'rb') as handle:
 		data = pickle.load(handle)
 	return data
\ No newline at end of file
@@ -4,6 +4,7 @@
 #
 #
 
+import tempfile
 
 # replace this with the local directory of this repository on your computer
 ROOT = "/home/inge/Documents/paper_code/Coral3Dmorphomeasures"
@@ -16,4 +17,14 @@ SMOOTH = f"{DATA}/vtk_smooth"
 LINE = f"{DATA}/vtk_line"
 
 # directories of results
-RESULTS = f"{ROOT}/example/results"
\ No newline at end of file
+RESULTS = f"{ROOT}/example/results"
+
+# directory of cached per-specimen results (e.g. curvature)
+CACHE = f"{ROOT}/example/cache"
+
+# directories of images (voxel images) and pictures
+IMG = f"{DATA}/mhd_img"
+PHOTO = f"{ROOT}/example/photos"
+
+# directory of temporary files (e.g. voxel images of the skeletonization)
+TEMP = tempfile.gettempdir()
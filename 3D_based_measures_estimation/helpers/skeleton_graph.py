@@ -0,0 +1,143 @@
+import numpy as np
+import vtk.util.numpy_support as nps
+
+class SkeletonGraph:
+	"""
+	Compact array-based representation of a skeleton graph (vtkPolyData of
+	lines). The point IDs of all branches are stored consecutively (CSR), such
+	that branch i consists of point_ids[offsets[i]:offsets[i+1]]. Branch IDs
+	and point IDs are the same as the cell IDs and point IDs of the
+	vtkPolyData object.
+
+	Attributes:
+		points (np.array, float): n_points x 3 coordinates (ordered by point ID)
+		thickness (np.array, float): point scalars, meant to be medial
+			thickness (ordered by point ID)
+		offsets (np.array, int): start of every branch in point_ids
+			(n_branches + 1)
+		point_ids (np.array, int): point IDs of all branches
+		degree (np.array, int): number of branches that contain each vertex
+	"""
+	__slots__ = ('points', 'thickness', 'offsets', 'point_ids', 'degree')
+
+	def __init__(self, points, thickness, offsets, point_ids):
+		"""
+		Args:
+			points (np.array, float): n_points x 3 coordinates
+			thickness (np.array, float): medial thickness of each vertex
+			offsets (np.array, int): start of every branch in point_ids
+			point_ids (np.array, int): point IDs of all branches
+		"""
+		self.points = points
+		self.thickness = thickness
+		self.offsets = offsets
+		self.point_ids = point_ids
+		self.degree = np.bincount(point_ids, minlength = points.shape[0])
+
+	@classmethod
+	def fromPolyLine(cls, poly_line):
+		"""
+		Builds the skeleton graph from the lines of a vtkPolyData object.
+
+		Args:
+			poly_line (vtk.vtkPolyData): skeleton graph
+
+		Returns:
+			SkeletonGraph: skeleton graph
+		"""
+		lines = poly_line.GetLines()
+		offsets = nps.vtk_to_numpy(lines.GetOffsetsArray()).astype(int)
+		point_ids = nps.vtk_to_numpy(lines.GetConnectivityArray()).astype(int)
+		points = nps.vtk_to_numpy(poly_line.GetPoints().GetData()).astype(float)
+
+		scalars = poly_line.GetPointData().GetScalars()
+		thickness = None
+		if scalars is not None:
+			thickness = nps.vtk_to_numpy(scalars).copy()
+		return cls(points, thickness, offsets, point_ids)
+
+	@property
+	def n_points(self):
+		return self.points.shape[0]
+
+	@property
+	def n_branches(self):
+		return self.offsets.shape[0] - 1
+
+	@property
+	def branch_sizes(self):
+		"""number of vertices in each branch"""
+		return np.diff(self.offsets)
+
+	@property
+	def starts(self):
+		"""point ID of the first vertex of each branch"""
+		return self.point_ids[self.offsets[:-1]]
+
+	@property
+	def ends(self):
+		"""point ID of the last vertex of each branch"""
+		return self.point_ids[self.offsets[1:] - 1]
+
+	def getBranch(self, branch_id):
+		"""
+		Obtain the point IDs of a branch (ordered as in the branch).
+
+		Args:
+			branch_id (int): branch (cell) ID
+
+		Returns:
+			np.array (int): point IDs of the branch
+		"""
+		return self.point_ids[self.offsets[branch_id]:self.offsets[branch_id + 1]]
+
+	def getBranchLabels(self):
+		"""
+		Obtain the branch ID of every entry of point_ids.
+
+		Returns:
+			np.array (int): branch ID of each entry of point_ids
+		"""
+		return np.repeat(np.arange(self.n_branches), self.branch_sizes)
+
+	def getPointBranches(self, point_id):
+		"""
+		Obtain the IDs of the branches that contain a vertex.
+
+		Args:
+			point_id (int): point ID
+
+		Returns:
+			np.array (int): branch IDs (sorted)
+		"""
+		return np.unique(self.getBranchLabels()[self.point_ids == point_id])
+
+	def getPointIncidence(self):
+		"""
+		Obtain the branches that contain each vertex (CSR), such that vertex i
+		is part of branches branch_ids[offsets[i]:offsets[i+1]].
+
+		Returns:
+			np.array (int): start of every vertex in branch_ids (n_points + 1)
+			np.array (int): branch IDs of all vertices (sorted per vertex)
+		"""
+		keys = np.unique(self.point_ids * self.n_branches + \
+			self.getBranchLabels())
+		pids = keys // self.n_branches
+		offsets = np.searchsorted(pids, np.arange(self.n_points + 1))
+		return offsets, keys % self.n_branches
+
+def getSkeletonGraph(poly_line):
+	"""
+	Returns the SkeletonGraph of a skeleton graph, such that skeleton measures
+	accept either a vtkPolyData object or a SkeletonGraph.
+
+	Args:
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+
+	Returns:
+		SkeletonGraph: skeleton graph
+	"""
+	if isinstance(poly_line, SkeletonGraph):
+		return poly_line
+	return SkeletonGraph.fromPolyLine(poly_line)
@@ -3,8 +3,12 @@ import numpy as np
 import math as m
 import vtk.util.numpy_support as nps
 
+# version of the curvature scheme, change when the results of getCurvature
+# change (invalidates cached results, see curvature_cache.py)
+CURVATURE_VERSION = 1
 
-def getCurvature(poly_data):
+
+def getCurvature(poly_data, engine = 'vtk', block_size = 1000000, dtype = float):
 	"""
 	Calculates the Gaussian (K), Mean (H), minimum curvature (k1) and maximum
 	curvature for each vertex of a polygon mesh. This is a VTK based 
@@ -18,7 +22,16 @@ def getCurvature(poly_data):
 
 	In this implentation curvature is obtained by looping over the faces rather
 	than over the edges as this seemed more suitable for the way polygon meshes
-	are structured within VTK.
+	are structured within VTK. With engine 'numpy' the vertices and faces are 
+	extracted once as numpy arrays and all faces are processed in batched array
+	operations (blocks of block_size faces), which is much faster for large 
+	meshes but gives the same result.
+
+	All accumulation is done in float64. With dtype np.float32 only the 
+	returned arrays are rounded to single precision, which halves their memory
+	and disk size. Every returned value then differs from the float64 result 
+	by at most a relative error of 2**-24 (~6e-8), values outside the float32
+	range (e.g. K of degenerate vertices) become +-inf.
 
 	[1] M. Meyer, M. Desbrun, P. Schroder and A.H. Barr. Discrete differential-
 	geometry operators for triangulated 2-manifolds. Visualization and 
@@ -26,6 +39,10 @@ def getCurvature(poly_data):
 
 	Args:
 		poly_data (vtk.vtkPolyData): polygon mesh
+		engine (str): 'vtk' (loop over every face) or 'numpy' (vectorized)
+		block_size (int): number of faces processed at once by the 'numpy' 
+			engine
+		dtype (np.dtype): dtype of the returned arrays (float or np.float32)
 	
 	Returns:
 		Dict: dictionary of numpy arrays (float) with keys
@@ -36,6 +53,108 @@ def getCurvature(poly_data):
 			- Areas: Amixed of each vertex (ordered by vertex ID)
 
 	"""
+	if engine == 'numpy':
+		points, faces = getMeshArrays(poly_data)
+		areas, angles, defic, normals = accumulateFaceTerms(points, faces, 
+			block_size)
+	elif engine == 'vtk':
+		areas, angles, defic = accumulateFaceTermsVTK(poly_data)
+		points, faces = getMeshArrays(poly_data)
+		normals = getVertexNormals(points, faces, block_size)
+	else:
+		raise ValueError(f"unknown curvature engine '{engine}' (use 'vtk' or 'numpy')")
+	del points, faces
+
+	return getCurvatureFromAccumulators(areas, angles, defic, normals, dtype)
+
+def getCurvatureSubset(poly_data, vertex_ids, dtype = float):
+	"""
+	Calculates the curvature (see getCurvature) of a subset of the vertices
+	of a polygon mesh. Only the faces incident to these vertices are 
+	gathered (see getIncidentFaces) and processed, so the cost is 
+	proportional to the size of the subset (e.g. the tip regions of the 
+	branches) rather than to the size of the mesh.
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		vertex_ids (np.array, int): IDs of the vertices
+		dtype (np.dtype): dtype of the returned arrays (see getCurvature)
+
+	Returns:
+		Dict: dictionary of numpy arrays (float) with the keys of getCurvature,
+			ordered as vertex_ids (NaN for vertices without faces)
+	"""
+	vertex_ids = np.asarray(vertex_ids, dtype = int).ravel()
+	n_points = poly_data.GetNumberOfPoints()
+	if np.any((vertex_ids < 0) | (vertex_ids >= n_points)):
+		raise ValueError('vertex IDs should be vertices of the polygon mesh')
+
+	# vertex coordinates and faces without copying the mesh
+	points = nps.vtk_to_numpy(poly_data.GetPoints().GetData())
+	polys = poly_data.GetPolys()
+	faces = nps.vtk_to_numpy(polys.GetConnectivityArray())
+	if faces.size != 3 * polys.GetNumberOfCells():
+		raise ValueError('polygon mesh should only consist of triangles')
+	sub_faces = faces.reshape(-1, 3)[getIncidentFaces(poly_data, vertex_ids)]
+
+	pids, areas, angle_sum, defic, normals = sumFaceBlockTerms(points, sub_faces)
+
+	# only the vertices of the subset have all their faces, vertices without
+	# faces are not in the block
+	idx = np.searchsorted(pids, vertex_ids)
+	found = idx < len(pids)
+	found[found] = (pids[idx[found]] == vertex_ids[found])
+	idx = idx[found]
+
+	# angle deficit = 2pi - sum(adjecent angles)
+	curvature = getCurvatureFromAccumulators(areas[idx], 
+		2 * m.pi - angle_sum[idx], defic[idx], normals[idx], dtype)
+	subset = {}
+	for key, val in curvature.items():
+		subset[key] = np.full(len(vertex_ids), np.nan, dtype = val.dtype)
+		subset[key][found] = val
+	return subset
+
+def getIncidentFaces(poly_data, vertex_ids):
+	"""
+	Obtains the faces incident to a subset of the vertices of a polygon mesh
+	with vtkPolyData.GetPointCells, without visiting the other faces.
+
+	Args:
+		poly_data (vtk.vtkPolyData): polygon mesh
+		vertex_ids (np.array, int): IDs of the vertices
+
+	Returns:
+		np.array (int): sorted face IDs (index of the faces in GetPolys)
+	"""
+	if poly_data.GetLinks() is None:
+		poly_data.BuildLinks()
+
+	# cell IDs of the faces follow those of the vertices and lines
+	n_other = poly_data.GetNumberOfVerts() + poly_data.GetNumberOfLines()
+	n_faces = poly_data.GetNumberOfPolys()
+	cell_ids = vtk.vtkIdList()
+	face_ids = []
+	for pid in np.unique(vertex_ids).tolist():
+		poly_data.GetPointCells(pid, cell_ids)
+		face_ids.extend(cell_ids.GetId(i) - n_other \
+			for i in range(cell_ids.GetNumberOfIds()))
+	face_ids = np.unique(np.asarray(face_ids, dtype = int))
+	return face_ids[(face_ids >= 0) & (face_ids < n_faces)]
+
+def accumulateFaceTermsVTK(poly_data):
+	"""
+	Loops over every face of a polygon mesh and sums the (8x) mixed area, the 
+	angle deficit and the (unscaled) MCNO of the corners to their vertices.
+
+	Args:
+		poly_data (vtk.vtkPolyData): polygon mesh
+
+	Returns:
+		np.array (float): 8 * Amixed of each vertex (ordered by vertex ID)
+		np.array (float): angle deficit of each vertex (ordered by vertex ID)
+		np.array (float): n_points x 3 sum of cot-weighted edge vectors
+	"""
 	n_points = poly_data.GetNumberOfPoints()
 	n_face = poly_data.GetNumberOfCells()
 
@@ -99,58 +218,251 @@ def getCurvature(poly_data):
 			areas[pid] += areas_tri[i]
 			angles[pid] -= angles_tri[i]
 
+	return areas, angles, defic
 
-	# K = angle deficit devided by associated vertex area
-	gauss = 8*angles/areas
-	MCNO = (4*defic.T/areas.T).T
-	mean_c = np.linalg.norm(MCNO, axis = 1)/2
-	areas /= 8 
-	del angles, defic
+def getMeshArrays(poly_data):
+	"""
+	Obtains the vertex coordinates and the vertex IDs of every triangle of a 
+	polygon mesh as numpy arrays (without looping over the mesh).
 
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
 
-	# get outward normal vector of each vertex
-	poly_normals = vtk.vtkTriangleMeshPointNormals()
-	poly_normals.SetInputData(poly_data)
-	poly_normals.Update()
-	poly_data = poly_normals.GetOutput()
-	del poly_normals
-	normals = poly_data.GetPointData().GetArray("Normals")
+	Returns:
+		np.array (float): n_points x 3 coordinates (ordered by vertex ID)
+		np.array (int): n_faces x 3 vertex IDs of each face (ordered by face ID)
+	"""
+	points = np.asarray(nps.vtk_to_numpy(poly_data.GetPoints().GetData()), 
+		dtype = float)
+	polys = poly_data.GetPolys()
+	faces = nps.vtk_to_numpy(polys.GetConnectivityArray())
+	if faces.size != 3 * polys.GetNumberOfCells():
+		raise ValueError('polygon mesh should only consist of triangles')
+	return points, faces.reshape(-1, 3)
 
-	for n in range(n_points):
-		# if H = 0, do not compare to norm
-		if not mean_c[n]:
-			continue
+def getFaceCurvatureTerms(points_tri):
+	"""
+	Vectorized version of the per-face step of accumulateFaceTermsVTK. For 
+	every corner of every face the angle, the (8x) mixed area and the 
+	cot-weighted edge vectors (contribution to the MCNO) are obtained.
 
-		norm = normals.GetTuple(n)
-		
-		# normalize the MCNO
-		meandir = 2*MCNO[n]/mean_c[n]
+	Args:
+		points_tri (np.array, float): n_faces x 3 x 3 coordinates of the 
+			corners of every face
+
+	Returns:
+		np.array (float): n_faces x 3 angle at each corner
+		np.array (float): n_faces x 3 (8x) mixed area of each corner
+		np.array (float): n_faces x 3 x 3 cot-weighted edge vectors of each 
+			corner
+		np.array (float): n_faces x 3 face normals (length is twice the area
+			of the face)
+	"""
+
+	# get the vectors of the faces (vecs[:,i] = p_i - p_i+1) and the vector
+	# of the previous corner (vecs[:,i-1])
+	vecs = points_tri - points_tri[:, [1, 2, 0]]
+	vecs_prev = vecs[:, [2, 0, 1]]
+	length_sq = np.einsum('ijk,ijk->ij', vecs, vecs)
+
+	# angle between -vecs[i] and vecs[i-1] (as vtkMath.AngleBetweenVectors)
+	cross = np.cross(-vecs, vecs_prev)
+	cross_norm = np.linalg.norm(cross, axis = 2)
+	angles_tri = np.arctan2(cross_norm, np.einsum('ijk,ijk->ij', -vecs, vecs_prev))
+	face_normals = cross[:, 0]
+	del cross
+
+	# calculate cotangens of every angle, of the previous (i-1) and the next
+	# (i-2) corner
+	cots = np.cos(angles_tri)/np.sin(angles_tri)
+	cots_prev = cots[:, [2, 0, 1]]
+	cots_next = cots[:, [1, 2, 0]]
 
-		# change the sign of the MCNO if the general direction is the same as 
-		# the normal vector 
-		if np.sum(norm * meandir) < 0:
-			mean_c[n] *= -1
+	# use the voronoi area to divide if there is no obtuse angle
+	areas_tri = cots_prev * length_sq + cots_next * length_sq[:, [2, 0, 1]]
+
+	# otherwise divide area of face to each vertex in fixed proportions (*8)
+	obtuse = (angles_tri > m.pi/2)
+	has_obtuse = np.any(obtuse, axis = 1)
+	area = cross_norm[has_obtuse, 0] / 2
+	areas_tri[has_obtuse] = np.where(obtuse[has_obtuse], 4, 2) * area[:, None]
+
+	defic_tri = cots_prev[:, :, None] * vecs - cots_next[:, :, None] * vecs_prev
+	return angles_tri, areas_tri, defic_tri, face_normals
+
+def accumulateFaceTerms(points, faces, block_size = 1000000, \
+		return_totals = False, return_cots = False):
+	"""
+	Vectorized equivalent of accumulateFaceTermsVTK. Faces are processed in 
+	blocks of block_size faces and the corner terms are summed to the vertices
+	with np.bincount. Optionally the surface area and the volume (divergence
+	theorem) of the mesh and the cotangent of every corner are obtained in the
+	same pass.
+
+	Args:
+		points (np.array, float): n_points x 3 vertex coordinates
+		faces (np.array, int): n_faces x 3 vertex IDs of each face
+		block_size (int): number of faces processed at once
+		return_totals (bool): also return the surface area and the volume
+		return_cots (bool): also return the cotangents of the corners
+
+	Returns:
+		np.array (float): 8 * Amixed of each vertex (ordered by vertex ID)
+		np.array (float): angle deficit of each vertex (ordered by vertex ID)
+		np.array (float): n_points x 3 sum of cot-weighted edge vectors
+		np.array (float): n_points x 3 area weighted normal of each vertex
+		float: surface area (only if return_totals)
+		float: volume (only if return_totals)
+		np.array (float): n_faces x 3 cotangent of the angle at each corner
+			(only if return_cots)
+	"""
+	n_points = points.shape[0]
+	areas = np.zeros(n_points)
+	angle_sum = np.zeros(n_points)
+	defic = np.zeros((n_points, 3))
+	normals = np.zeros((n_points, 3))
+	surface = 0
+	volume = 0
+	if return_cots:
+		cots = np.zeros(faces.shape)
+
+	for start in range(0, faces.shape[0], block_size):
+		block = faces[start:start + block_size]
+		points_tri = points[block]
+		angles_tri, areas_tri, defic_tri, face_normals = \
+			getFaceCurvatureTerms(points_tri)
+		if return_cots:
+			cots[start:start + block_size] = np.cos(angles_tri) / \
+				np.sin(angles_tri)
+
+		# sum the terms of every corner to its vertex
+		pids = block.ravel()
+		areas += np.bincount(pids, areas_tri.ravel(), n_points)
+		angle_sum += np.bincount(pids, angles_tri.ravel(), n_points)
+		defic_tri = defic_tri.reshape(-1, 3)
+		for i in range(3):
+			defic[:, i] += np.bincount(pids, defic_tri[:, i], n_points)
+			normals[:, i] += np.bincount(pids, 
+				np.repeat(face_normals[:, i], 3), n_points)
+
+		if return_totals:
+			# volume = sum of signed volumes of tetrahedra (face, origin)
+			surface += np.sum(np.linalg.norm(face_normals, axis = 1)) / 2
+			volume += np.sum(points_tri[:, 0] * face_normals) / 6
+
+	# angle deficit = 2pi - sum(adjecent angles)
+	angles = 2 * m.pi - angle_sum
+	result = (areas, angles, defic, normals)
+	if return_totals:
+		result += (surface, abs(volume))
+	if return_cots:
+		result += (cots,)
+	return result
+
+def sumFaceBlockTerms(points, block):
+	"""
+	Sums the corner terms of a block of faces (see getFaceCurvatureTerms) per
+	vertex of the block. Only the vertices in the block are returned, so the
+	size of the output is bounded by the size of the block.
+
+	Args:
+		points (np.array, float): n_points x 3 vertex coordinates
+		block (np.array, int): n_faces x 3 vertex IDs of each face in block
+
+	Returns:
+		np.array (int): vertex IDs in the block (sorted)
+		np.array (float): 8 * Amixed of each vertex in the block
+		np.array (float): sum of adjecent angles of each vertex in the block
+		np.array (float): n x 3 sum of cot-weighted edge vectors
+		np.array (float): n x 3 area weighted normal of each vertex
+	"""
+
+	# renumber the vertices of the block
+	pids, local_ids = np.unique(block, return_inverse = True)
+	local_ids = local_ids.ravel()
+	n_local = pids.shape[0]
+
+	angles_tri, areas_tri, defic_tri, face_normals = \
+		getFaceCurvatureTerms(np.asarray(points[pids], dtype = float)[
+			local_ids.reshape(-1, 3)])
+
+	areas = np.bincount(local_ids, areas_tri.ravel(), n_local)
+	angle_sum = np.bincount(local_ids, angles_tri.ravel(), n_local)
+	defic_tri = defic_tri.reshape(-1, 3)
+	defic = np.zeros((n_local, 3))
+	normals = np.zeros((n_local, 3))
+	for i in range(3):
+		defic[:, i] = np.bincount(local_ids, defic_tri[:, i], n_local)
+		normals[:, i] = np.bincount(local_ids, 
+			np.repeat(face_normals[:, i], 3), n_local)
+	return pids, areas, angle_sum, defic, normals
+
+def getVertexNormals(points, faces, block_size = 1000000):
+	"""
+	Obtains the outward normal vector of each vertex as the area weighted sum
+	of the normals of its faces (as vtkTriangleMeshPointNormals, but without 
+	making a copy of the mesh). The normals are not normalized.
+
+	Args:
+		points (np.array, float): n_points x 3 vertex coordinates
+		faces (np.array, int): n_faces x 3 vertex IDs of each face
+		block_size (int): number of faces processed at once
+
+	Returns:
+		np.array (float): n_points x 3 normal vector of each vertex
+	"""
+	n_points = points.shape[0]
+	normals = np.zeros((n_points, 3))
+	for start in range(0, faces.shape[0], block_size):
+		block = faces[start:start + block_size]
+		points_tri = points[block]
+
+		# length of the cross product is twice the area of the face
+		face_normals = np.cross(points_tri[:, 1] - points_tri[:, 0], 
+			points_tri[:, 2] - points_tri[:, 0])
+		pids = block.ravel()
+		for i in range(3):
+			normals[:, i] += np.bincount(pids, 
+				np.repeat(face_normals[:, i], 3), n_points)
+	return normals
+
+def getCurvatureFromAccumulators(areas, angles, defic, normals, dtype = float):
+	"""
+	Obtains the curvature of every vertex from the summed face terms of 
+	accumulateFaceTermsVTK or accumulateFaceTerms. All steps are whole-array
+	operations in float64, only the results are converted to dtype.
+
+	Args:
+		areas (np.array, float): 8 * Amixed of each vertex
+		angles (np.array, float): angle deficit of each vertex
+		defic (np.array, float): n_points x 3 sum of cot-weighted edge vectors
+		normals (np.array, float): n_points x 3 outward normal of each vertex
+		dtype (np.dtype): dtype of the returned arrays
 	
-	del normals, poly_data	
+	Returns:
+		Dict: dictionary of numpy arrays (float), see getCurvature
+	"""
+
+	# K = angle deficit devided by associated vertex area
+	gauss = 8*angles/areas
+	MCNO = 4*defic/areas[:, None]
+	mean_c = np.linalg.norm(MCNO, axis = 1)/2
+	areas /= 8 
+	del angles, defic
+
+	# change the sign of H if the MCNO points away from the normal vector (if
+	# H = 0 the sign does not matter)
+	opposite = np.einsum('ij,ij->i', normals, MCNO) < 0
+	mean_c[opposite] *= -1
+	del MCNO, opposite
 	
+	# calculate k1 and k2 as H +- sqrt(H^2-K), if no real solution exists 
+	# using the standard formula take H
 	kprep = mean_c * mean_c - gauss
-	
-	# calculate k1 and k2
-	k_min = np.zeros(n_points)
-	k_max = np.zeros(n_points)
-	for i in range(n_points):
-		kp = kprep[i]
-		h = mean_c[i]
-		
-		# if no real solution exists using the standard formula take H
-		if kp < 0:
-			k_min[i] = h
-			k_max[i] = h
-		# otherwise take H +- sqrt(K^2-H)
-		else:		
-			k_min[i] = h - m.sqrt(kp)
-			k_max[i] = h + m.sqrt(kp)
-
-	return {'Gauss':gauss, 'Mean': mean_c, 'Minimum': k_min, 'Maximum': k_max, \
-		'areas':areas}
+	kroot = np.sqrt(np.maximum(kprep, 0))
+	k_min = mean_c - kroot
+	k_max = mean_c + kroot
 
+	curvature = {'Gauss':gauss, 'Mean': mean_c, 'Minimum': k_min, \
+		'Maximum': k_max, 'areas':areas}
+	return {key: val.astype(dtype, copy = False) for key, val in curvature.items()}
@@ -0,0 +1,112 @@
+"""
+curvature_cache.py
+
+This module is used to cache the curvature of polygon meshes on local disk. 
+Results are stored as compressed numpy arrays (.npz) and are identified by a
+hash of the vertex coordinates and faces of the mesh, the version of the 
+curvature scheme and the parameters of getCurvature, such that curvature is only recalculated if the mesh 
+changed. The least recently used results are removed when the cache exceeds
+its maximum size.
+"""
+
+import os
+import glob
+import hashlib
+import numpy as np
+from helpers import local_directories as ldir
+from .curvature import getCurvature, getMeshArrays, CURVATURE_VERSION
+
+def getCachedCurvature(poly_data, cache_dir = ldir.CACHE, \
+		max_size = 5 * 1024**3, engine = 'numpy', block_size = 1000000, \
+		dtype = float):
+	"""
+	Returns the curvature of a polygon mesh (see curvature.getCurvature) from
+	the cache, or calculates and caches it if the mesh is not in the cache.
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		cache_dir (str): directory of the cache
+		max_size (int): maximum size of the cache in bytes
+		engine (str): engine of getCurvature if not cached
+		block_size (int): block size of getCurvature if not cached
+		dtype (np.dtype): dtype of the arrays (see curvature.getCurvature)
+
+	Returns:
+		Dict: dictionary of numpy arrays (float), see curvature.getCurvature
+	"""
+	os.makedirs(cache_dir, exist_ok = True)
+	mesh_hash = getMeshHash(poly_data, engine, dtype, block_size)
+	file_name = f"{cache_dir}/{mesh_hash}.npz"
+
+	if os.path.isfile(file_name):
+		# mark the result as recently used
+		os.utime(file_name)
+		with np.load(file_name) as cached:
+			return {key: cached[key] for key in cached.files}
+
+	curvature = getCurvature(poly_data, engine = engine, block_size = block_size, 
+		dtype = dtype)
+
+	# write to a temporary file first, such that other processes never read
+	# an incomplete result
+	temp_name = f"{file_name}.{os.getpid()}.tmp"
+	with open(temp_name, 'wb') as handle:
+		np.savez_compressed(handle, **curvature)
+	os.replace(temp_name, file_name)
+
+	evictCache(cache_dir, max_size)
+	return curvature
+
+def getMeshHash(poly_data, engine = 'numpy', dtype = float, \
+		block_size = 1000000):
+	"""
+	Obtains the key of a polygon mesh in the cache: a hash of the vertex 
+	coordinates and faces, the curvature version, the engine, the dtype and 
+	the block size (the summation order of the face terms, and so the last 
+	bits of the results, depend on it).
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		engine (str): engine of getCurvature
+		dtype (np.dtype): dtype of the arrays
+		block_size (int): block size of getCurvature
+
+	Returns:
+		str: hexadecimal hash
+	"""
+	points, faces = getMeshArrays(poly_data)
+	mesh_hash = hashlib.blake2b(digest_size = 20)
+	mesh_hash.update((f"{CURVATURE_VERSION}-{engine}-{np.dtype(dtype).name}-" \
+		f"{int(block_size)}-{points.shape}-{faces.shape}").encode())
+	mesh_hash.update(np.ascontiguousarray(points).data)
+	mesh_hash.update(np.ascontiguousarray(faces, dtype = np.int64).data)
+	return mesh_hash.hexdigest()
+
+def evictCache(cache_dir = ldir.CACHE, max_size = 5 * 1024**3):
+	"""
+	Removes the least recently used results until the total size of the cache
+	is at most max_size bytes.
+
+	Args:
+		cache_dir (str): directory of the cache
+		max_size (int): maximum size of the cache in bytes
+
+	Returns:
+		None
+	"""
+	entries = []
+	for file_name in glob.glob(f"{cache_dir}/*.npz"):
+		stat = os.stat(file_name)
+		entries.append((stat.st_mtime, stat.st_size, file_name))
+
+	# remove oldest results first
+	entries.sort()
+	total = sum(entry[1] for entry in entries)
+	for _, size, file_name in entries:
+		if total <= max_size:
+			break
+		try:
+			os.remove(file_name)
+		except FileNotFoundError:
+			pass
+		total -= size
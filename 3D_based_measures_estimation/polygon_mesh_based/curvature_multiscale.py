@@ -0,0 +1,99 @@
+"""
+curvature_multiscale.py
+
+This module is used to calculate curvature of a polygon mesh at multiple 
+scales. The discrete operator of curvature.getCurvature only uses the one-ring
+of every vertex and is therefore noisy on high resolution meshes. Here the 
+per-vertex terms (areas, angle deficits, MCNO and normal vectors) are obtained
+once and averaged over larger neighbourhoods with the sparse vertex adjacency
+matrix of a MeshOperator, such that all scales are obtained from a single 
+pass over the faces.
+"""
+
+import numpy as np
+import math as m
+import scipy.sparse as sps
+from .curvature import getCurvatureFromAccumulators
+from .mesh_operator import MeshOperator
+
+def getMultiScaleCurvature(poly_data, rings = (1, 2, 4), radii = None, \
+		block_size = 1000000, operator = None, dtype = float):
+	"""
+	Calculates the Gaussian, mean, minimum and maximum curvature of every 
+	vertex averaged over the k-ring neighbourhood of the vertex for several k.
+	The integrated terms of each vertex are averaged k times over the direct
+	neighbours (including the vertex itself), which gives a weighted average
+	over the k-ring. Curvature is then obtained from the averaged terms as in 
+	curvature.getCurvature, so K and H are area weighted averages of the 
+	one-ring K and H. 
+
+	Scales can also be given as physical radii, these are converted to a 
+	number of rings using the mean edge length of the mesh.
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		rings (tuple, int): numbers of rings (0 is the one-ring curvature of
+			curvature.getCurvature)
+		radii (list, float): radii (in mesh units), used instead of rings if 
+			given
+		block_size (int): number of faces processed at once
+		operator (MeshOperator): operators of poly_data, built if not given
+		dtype (np.dtype): dtype of the returned arrays (see 
+			curvature.getCurvature)
+
+	Returns:
+		Dict: for every ring (or radius) a dictionary of numpy arrays (float)
+			with the keys of curvature.getCurvature. The areas are the 
+			(one-ring) Amixed of each vertex for every scale.
+	"""
+	if operator is None:
+		operator = MeshOperator.fromPolyData(poly_data, block_size)
+	
+	# convert radii to a number of rings
+	if radii is not None:
+		points = operator.points
+		faces = operator.faces
+		edges = points[faces] - points[faces[:, [1, 2, 0]]]
+		mean_edge = np.mean(np.linalg.norm(edges, axis = 2))
+		del edges
+		scales = {r: max(int(round(r / mean_edge)), 0) for r in radii}
+	else:
+		scales = {k: k for k in rings}
+
+	averaging = getAveragingMatrix(operator.adjacency)
+
+	# all terms as columns: 8*Amixed, angle deficit, MCNO (3) and normals (3)
+	terms = operator.terms
+	one_ring_areas = terms[:, 0] / 8
+
+	curvature = {}
+	k = 0
+	for scale, n_rings in sorted(scales.items(), key = lambda s: s[1]):
+
+		# average the terms over one more ring until n_rings is reached
+		while k < n_rings:
+			terms = averaging @ terms
+			k += 1
+
+		curv_scale = getCurvatureFromAccumulators(terms[:, 0].copy(), 
+			terms[:, 1], terms[:, 2:5], terms[:, 5:8], dtype)
+		curv_scale['areas'] = one_ring_areas.astype(dtype, copy = False)
+		curvature[scale] = curv_scale
+	return curvature
+
+def getAveragingMatrix(adjacency):
+	"""
+	Obtains the row-normalized matrix that averages a per-vertex value over
+	the vertex and its direct neighbours.
+
+	Args:
+		adjacency (scipy.sparse.csr_matrix): vertex adjacency matrix (see 
+			MeshOperator)
+
+	Returns:
+		scipy.sparse.csr_matrix (float): n_points x n_points averaging matrix
+	"""
+	n_points = adjacency.shape[0]
+	neighbours = adjacency + sps.identity(n_points, format = 'csr')
+	n_neigh = np.asarray(neighbours.sum(axis = 1)).ravel()
+	return sps.diags(1 / n_neigh) @ neighbours
@@ -0,0 +1,113 @@
+"""
+curvature_parallel.py
+
+This module is used to calculate the curvature of a polygon mesh (see 
+curvature.getCurvature) on multiple cores. The vertices and faces are placed
+in shared memory, the faces are divided in chunks that are processed by a 
+pool of workers and the per-vertex partial sums of the chunks are reduced in
+chunk order, such that the result does not depend on the number of workers.
+"""
+
+import os
+import numpy as np
+import math as m
+from multiprocessing import Pool, shared_memory
+from .curvature import getMeshArrays, sumFaceBlockTerms, \
+	getCurvatureFromAccumulators
+
+# shared arrays of a worker process (filled by initWorker)
+WORKER_ARRAYS = {}
+
+def getCurvatureParallel(poly_data, n_workers = None, block_size = 250000, \
+		dtype = float):
+	"""
+	Calculates the curvature of every vertex of a polygon mesh with a pool of
+	workers. The faces are divided in chunks of block_size faces, independent
+	of the number of workers, and the partial sums of the chunks are added in
+	chunk order. The result is therefore bit-for-bit the same for any number
+	of workers (and equal to getCurvature with engine 'numpy' and the same
+	block_size).
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		n_workers (int): number of worker processes (defaults to the number 
+			of cores)
+		block_size (int): number of faces per chunk
+		dtype (np.dtype): dtype of the returned arrays (see 
+			curvature.getCurvature)
+
+	Returns:
+		Dict: dictionary of numpy arrays (float), see curvature.getCurvature
+	"""
+	if n_workers is None:
+		n_workers = os.cpu_count()
+	points, faces = getMeshArrays(poly_data)
+	n_points = points.shape[0]
+	n_faces = faces.shape[0]
+	chunks = [(start, min(start + block_size, n_faces)) \
+		for start in range(0, n_faces, block_size)]
+
+	areas = np.zeros(n_points)
+	angle_sum = np.zeros(n_points)
+	defic = np.zeros((n_points, 3))
+	normals = np.zeros((n_points, 3))
+
+	# place the vertices and faces in shared memory
+	shared = {}
+	try:
+		for key, arr in [('points', points), ('faces', faces)]:
+			shm = shared_memory.SharedMemory(create = True, size = arr.nbytes)
+			np.ndarray(arr.shape, dtype = arr.dtype, buffer = shm.buf)[:] = arr
+			shared[key] = shm
+		specs = {key: (shared[key].name, arr.shape, arr.dtype) \
+			for key, arr in [('points', points), ('faces', faces)]}
+		del points, faces
+
+		with Pool(n_workers, initializer = initWorker, initargs = (specs,)) \
+				as pool:
+
+			# reduce the partial sums in chunk order
+			for pids, p_areas, p_angles, p_defic, p_normals in \
+					pool.imap(sumFaceChunk, chunks):
+				areas[pids] += p_areas
+				angle_sum[pids] += p_angles
+				defic[pids] += p_defic
+				normals[pids] += p_normals
+	finally:
+		for shm in shared.values():
+			shm.close()
+			shm.unlink()
+
+	# angle deficit = 2pi - sum(adjecent angles)
+	angles = 2 * m.pi - angle_sum
+	return getCurvatureFromAccumulators(areas, angles, defic, normals, dtype)
+
+def initWorker(specs):
+	"""
+	Attaches a worker process to the shared vertex and face arrays.
+
+	Args:
+		specs (dict): name, shape and dtype of the shared memory of each array
+
+	Returns:
+		None
+	"""
+	for key, (name, shape, dtype) in specs.items():
+		shm = shared_memory.SharedMemory(name = name)
+		WORKER_ARRAYS[key] = (shm, np.ndarray(shape, dtype = dtype, 
+			buffer = shm.buf))
+
+def sumFaceChunk(chunk):
+	"""
+	Sums the corner terms of a chunk of the shared faces per vertex (see
+	curvature.sumFaceBlockTerms).
+
+	Args:
+		chunk (tuple, int): first and last (exclusive) face ID of the chunk
+
+	Returns:
+		tuple: vertex IDs in the chunk and their partial sums
+	"""
+	points = WORKER_ARRAYS['points'][1]
+	faces = WORKER_ARRAYS['faces'][1]
+	return sumFaceBlockTerms(points, faces[chunk[0]:chunk[1]])
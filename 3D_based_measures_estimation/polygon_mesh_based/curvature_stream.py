@@ -0,0 +1,134 @@
+"""
+curvature_stream.py
+
+This module is used to calculate the curvature of polygon meshes that do not
+fit in memory. The vertices and faces are stored as memory-mapped numpy
+arrays (a mesh store) and the faces are processed in blocks, such that the
+peak memory is bounded by the block size rather than by the size of the mesh.
+The result is the same as that of curvature.getCurvature.
+"""
+
+import os
+import numpy as np
+import math as m
+from .curvature import getMeshArrays, sumFaceBlockTerms, \
+	getCurvatureFromAccumulators
+
+CURVATURE_KEYS = ['Gauss', 'Mean', 'Minimum', 'Maximum', 'areas']
+
+def writeMeshStore(poly_data, store_dir):
+	"""
+	Writes the vertex coordinates and faces of a polygon mesh to a mesh store
+	(points.npy and faces.npy) that can be memory-mapped by getCurvatureStream.
+
+	Args:
+		poly_data (vtk.vtkPolyData): triangulated polygon mesh
+		store_dir (str): directory of the mesh store
+
+	Returns:
+		None
+	"""
+	points, faces = getMeshArrays(poly_data)
+	np.save(f"{store_dir}/points.npy", points)
+	np.save(f"{store_dir}/faces.npy", faces)
+
+def readMeshStore(store_dir):
+	"""
+	Opens the vertex coordinates and faces of a mesh store as read-only
+	memory-mapped arrays.
+
+	Args:
+		store_dir (str): directory of the mesh store
+
+	Returns:
+		np.memmap (float): n_points x 3 vertex coordinates
+		np.memmap (int): n_faces x 3 vertex IDs of each face
+	"""
+	points = np.load(f"{store_dir}/points.npy", mmap_mode = 'r')
+	faces = np.load(f"{store_dir}/faces.npy", mmap_mode = 'r')
+	return points, faces
+
+def getCurvatureStream(store_dir, out_dir = None, block_size = 1000000, \
+		dtype = float):
+	"""
+	Calculates the curvature of every vertex of a mesh store (see
+	curvature.getCurvature) block by block. Per-vertex areas, angles, MCNO
+	and normal vectors are summed into memory-mapped accumulators in out_dir,
+	which are removed after the curvature is obtained.
+
+	Args:
+		store_dir (str): directory of the mesh store (see writeMeshStore)
+		out_dir (str): directory for the accumulators and the results
+			(defaults to store_dir)
+		block_size (int): number of faces (and vertices in the final pass)
+			held in memory at once
+		dtype (np.dtype): dtype of the results (see curvature.getCurvature),
+			the accumulators are always float64
+
+	Returns:
+		Dict: dictionary of memory-mapped numpy arrays (dtype) stored in
+			out_dir as <key>.npy, keys as in curvature.getCurvature
+	"""
+	if out_dir is None:
+		out_dir = store_dir
+	points, faces = readMeshStore(store_dir)
+	n_points = points.shape[0]
+
+	# make the accumulators
+	acc_shapes = {'areas': (n_points,), 'angles': (n_points,),
+		'defic': (n_points, 3), 'normals': (n_points, 3)}
+	acc = {}
+	for key, shape in acc_shapes.items():
+		acc[key] = np.lib.format.open_memmap(f"{out_dir}/{key}_acc.npy",
+			mode = 'w+', dtype = float, shape = shape)
+
+	# sum the terms of every block of faces to their vertices
+	for start in range(0, faces.shape[0], block_size):
+		block = np.asarray(faces[start:start + block_size])
+		accumulateFaceBlock(points, block, acc)
+
+	# calculate curvature from the accumulators per block of vertices
+	curvature = {}
+	for key in CURVATURE_KEYS:
+		curvature[key] = np.lib.format.open_memmap(f"{out_dir}/{key}.npy",
+			mode = 'w+', dtype = dtype, shape = (n_points,))
+
+	for start in range(0, n_points, block_size):
+		stop = min(start + block_size, n_points)
+
+		# angle deficit = 2pi - sum(adjecent angles)
+		curv_block = getCurvatureFromAccumulators(
+			np.array(acc['areas'][start:stop]),
+			2 * m.pi - acc['angles'][start:stop],
+			np.array(acc['defic'][start:stop]),
+			np.array(acc['normals'][start:stop]), dtype)
+		for key in CURVATURE_KEYS:
+			curvature[key][start:stop] = curv_block[key]
+
+	for key in acc_shapes:
+		del acc[key]
+		os.remove(f"{out_dir}/{key}_acc.npy")
+	for key in CURVATURE_KEYS:
+		curvature[key].flush()
+	return curvature
+
+def accumulateFaceBlock(points, block, acc):
+	"""
+	Sums the corner terms of a block of faces to the accumulators of their
+	vertices. Only the vertices in the block are read from and written to the
+	(memory-mapped) arrays.
+
+	Args:
+		points (np.array, float): n_points x 3 vertex coordinates
+		block (np.array, int): n_faces x 3 vertex IDs of each face in block
+		acc (dict): accumulators with keys areas, angles (sum of angles),
+			defic and normals (see getCurvatureStream)
+
+	Returns:
+		None
+	"""
+	pids, areas, angle_sum, defic, normals = sumFaceBlockTerms(points, block)
+	acc['areas'][pids] += areas
+	acc['angles'][pids] += angle_sum
+	acc['defic'][pids] += defic
+	acc['normals'][pids] += normals
@@ -0,0 +1,42 @@
+"""
+mesh_measures.py
+
+This module is used to calculate all polygon mesh-based measures (surface 
+area and volume related measures and curvature) in a single pass over the 
+faces of a polygon mesh, instead of running vtkMassProperties and 
+getCurvature separately.
+"""
+
+from .curvature import getMeshArrays, accumulateFaceTerms, \
+	getCurvatureFromAccumulators
+from .surface_volume import getSurfaceVolumeRatios
+
+def getMeshMeasures(poly_data, block_size = 1000000, dtype = float):
+	"""
+	Get the measures of surface_volume.getSurfaceVolumeMeasures and 
+	curvature.getCurvature in one pass over the faces. The surface area is the
+	sum of the face areas and the volume is obtained with the divergence 
+	theorem (the mesh should be closed).
+
+	Args:
+		poly_data (vtk.vtkPolyData): closed triangulated polygon mesh
+		block_size (int): number of faces processed at once
+		dtype (np.dtype): dtype of the curvature arrays (see 
+			curvature.getCurvature)
+
+	Returns:
+		Dict: dictionary with keys
+			- SA, V, SV_ratio, sphericity: float values (see 
+			  surface_volume.getSurfaceVolumeMeasures)
+			- Gauss, Mean, Minimum, Maximum, areas: numpy arrays (see 
+			  curvature.getCurvature)
+	"""
+	points, faces = getMeshArrays(poly_data)
+	areas, angles, defic, normals, sa, v = accumulateFaceTerms(points, faces, 
+		block_size, return_totals = True)
+	del points, faces
+
+	surf_vol = getSurfaceVolumeRatios(sa, v)
+	curvature = getCurvatureFromAccumulators(areas, angles, defic, normals, 
+		dtype)
+	return {**surf_vol, **curvature}
@@ -0,0 +1,183 @@
+"""
+mesh_operator.py
+
+This module contains the MeshOperator, which holds the sparse operators of a
+triangulated polygon mesh (cotangent Laplacian, mixed area mass matrix, 
+vertex-face incidence and vertex adjacency). The operators are built in a 
+single pass over the faces and can be shared by curvature, smoothing and 
+region queries, such that the geometry of a mesh is only processed once.
+"""
+
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+from .curvature import getMeshArrays, accumulateFaceTerms, \
+	getCurvatureFromAccumulators
+
+class MeshOperator:
+	"""
+	Sparse operators of a triangulated polygon mesh.
+
+	Attributes:
+		points (np.array, float): n_points x 3 vertex coordinates
+		faces (np.array, int): n_faces x 3 vertex IDs of each face
+		laplacian (scipy.sparse.csr_matrix): cotangent Laplacian L, with 
+			L_ij = -(cot a_ij + cot b_ij)/2 and L_ii = -sum_j L_ij
+		mass (scipy.sparse.csr_matrix): diagonal matrix of Amixed
+		incidence (scipy.sparse.csr_matrix): n_points x n_faces vertex-face
+			incidence
+		adjacency (scipy.sparse.csr_matrix): vertex adjacency (1 per edge)
+		terms (np.array, float): n_points x 8 summed face terms of each vertex
+			(8*Amixed, angle deficit, MCNO (3) and normal vector (3), see 
+			curvature.accumulateFaceTerms)
+	"""
+	def __init__(self, points, faces, block_size = 1000000):
+		"""
+		Builds the operators from vertex coordinates and faces.
+
+		Args:
+			points (np.array, float): n_points x 3 vertex coordinates
+			faces (np.array, int): n_faces x 3 vertex IDs of each face
+			block_size (int): number of faces processed at once
+		"""
+		self.points = np.asarray(points, dtype = float)
+		self.faces = np.asarray(faces)
+		self.n_points = self.points.shape[0]
+		self.n_faces = self.faces.shape[0]
+
+		# cached factorizations of (mass + step * laplacian)
+		self.factorizations = {}
+		self.buildOperators(block_size)
+
+	@classmethod
+	def fromPolyData(cls, poly_data, block_size = 1000000):
+		"""
+		Builds the operators of a vtkPolyData object.
+
+		Args:
+			poly_data (vtk.vtkPolyData): triangulated polygon mesh
+			block_size (int): number of faces processed at once
+
+		Returns:
+			MeshOperator: operators of the mesh
+		"""
+		points, faces = getMeshArrays(poly_data)
+		return cls(points, faces, block_size)
+
+	def buildOperators(self, block_size = 1000000):
+		"""
+		Obtains the summed face terms and the cotangent weights of every edge in
+		one pass over the faces (see curvature.accumulateFaceTerms) and 
+		assembles the sparse matrices.
+		"""
+		n_points = self.n_points
+		areas, angles, defic, normals, cots = accumulateFaceTerms(self.points, 
+			self.faces, block_size, return_cots = True)
+		self.terms = np.column_stack([areas, angles, defic, normals])
+		del defic, normals
+
+		# the edge from corner i to i+1 is opposite of corner i-1
+		edge_weights = cots[:, [2, 0, 1]] / 2
+		del cots
+
+		# assemble the symmetric cotangent weights of every edge
+		rows = self.faces.ravel()
+		cols = self.faces[:, [1, 2, 0]].ravel()
+		weights = sps.csr_matrix((edge_weights.ravel(), (rows, cols)), 
+			shape = (n_points, n_points))
+		weights = weights + weights.T
+		degree = np.asarray(weights.sum(axis = 1)).ravel()
+		self.laplacian = (sps.diags(degree) - weights).tocsr()
+		self.mass = sps.diags(areas / 8, format = 'csr')
+
+		# 1 for every edge of a face (also if its cotangent weights cancel)
+		adjacency = sps.csr_matrix((np.ones(rows.shape[0]), (rows, cols)), 
+			shape = (n_points, n_points))
+		self.adjacency = adjacency + adjacency.T
+		self.adjacency.data[:] = 1
+
+		self.incidence = sps.csr_matrix((np.ones(rows.shape[0]), 
+			(rows, np.repeat(np.arange(self.n_faces), 3))), 
+			shape = (n_points, self.n_faces))
+
+	def getCurvature(self, dtype = float):
+		"""
+		Obtains the curvature of every vertex from the summed face terms (same
+		as curvature.getCurvature with engine 'numpy').
+
+		Args:
+			dtype (np.dtype): dtype of the returned arrays
+
+		Returns:
+			Dict: dictionary of numpy arrays (float), see curvature.getCurvature
+		"""
+		terms = self.terms
+		return getCurvatureFromAccumulators(terms[:, 0].copy(), terms[:, 1], 
+			terms[:, 2:5], terms[:, 5:8], dtype)
+
+	def getIncidentFaces(self, vertex_ids):
+		"""
+		Obtains the IDs of all faces that contain at least one of the vertices.
+
+		Args:
+			vertex_ids (np.array, int): vertex IDs
+
+		Returns:
+			np.array (int): face IDs (sorted)
+		"""
+		return np.unique(self.incidence[vertex_ids].indices)
+
+	def getRingNeighbours(self, vertex_ids, rings = 1):
+		"""
+		Obtains the IDs of all vertices within the k-ring of the vertices.
+
+		Args:
+			vertex_ids (np.array, int): vertex IDs
+			rings (int): number of rings
+
+		Returns:
+			np.array (int): vertex IDs (sorted, including vertex_ids)
+		"""
+		selected = np.zeros(self.n_points, dtype = bool)
+		selected[vertex_ids] = True
+		for _ in range(rings):
+			selected = selected | (self.adjacency @ selected > 0)
+		return np.flatnonzero(selected)
+
+	def solve(self, values, step):
+		"""
+		Solves (mass + step * laplacian) x = mass * values, the factorization 
+		of the system is cached per step for repeated solves.
+
+		Args:
+			values (np.array, float): n_points (x n) values per vertex
+			step (float): time step of the diffusion
+
+		Returns:
+			np.array (float): diffused values
+		"""
+		if step not in self.factorizations:
+			system = (self.mass + step * self.laplacian).tocsc()
+			self.factorizations[step] = spla.factorized(system)
+		solve = self.factorizations[step]
+		rhs = self.mass @ values
+		if rhs.ndim == 1:
+			return solve(rhs)
+		return np.column_stack([solve(rhs[:, i]) for i in range(rhs.shape[1])])
+
+	def smoothPoints(self, step = 0.001, n_iter = 10):
+		"""
+		Smooths the vertex coordinates by implicit diffusion (implicit fairing)
+		with the operators of the original mesh.
+
+		Args:
+			step (float): time step of every iteration (in squared mesh units)
+			n_iter (int): number of iterations
+
+		Returns:
+			np.array (float): n_points x 3 smoothed vertex coordinates
+		"""
+		points = self.points
+		for _ in range(n_iter):
+			points = self.solve(points, step)
+		return points
@@ -27,6 +27,20 @@ def getSurfaceVolumeMeasures(poly_data):
 	
 	# calculate surface area and volume
 	sa, v = getSurfaceVolume(poly_data)
+	return getSurfaceVolumeRatios(sa, v)
+
+def getSurfaceVolumeRatios(sa, v):
+	"""
+	Get the measures of getSurfaceVolumeMeasures from the surface area and 
+	volume of a polygon mesh.
+
+	Args:
+		sa (float): surface area
+		v (float): volume
+
+	Returns:
+		Dict: dictionary of float values, see getSurfaceVolumeMeasures
+	"""
 
 	# S/V-ratio = SA/V
 	sv_ratio = sa/v
@@ -1,4 +1,21 @@
 import numpy as np
+from polygon_mesh_based.curvature import getCurvatureSubset
 
 def getEndCurvature(curvature, end_points, measure = 'gauss'): 
-	return curvature[measure][end_points['point_ids']]
\ No newline at end of file
+	return curvature[measure][end_points['point_ids']]
+
+def getEndCurvatureSubset(poly_data, end_points, measure = 'Gauss'):
+	"""
+	Obtains the curvature at the tips of the branches without calculating the
+	curvature of the whole polygon mesh (see curvature.getCurvatureSubset).
+
+	Args:
+		poly_data (vtk.vtkPolyData): polygon mesh
+		end_points (dict): tip vertices (see getEndPointsPolyData)
+		measure (str): Gauss, Mean, Minimum or Maximum
+
+	Returns:
+		np.array (float): curvature of each tip vertex (ordered as point_ids)
+	"""
+	curvature = getCurvatureSubset(poly_data, end_points['point_ids'])
+	return curvature[measure]
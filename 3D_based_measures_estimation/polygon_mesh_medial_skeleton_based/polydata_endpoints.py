@@ -1,8 +1,16 @@
 import vtk
 import numpy as np 
 import vtk.util.numpy_support as nps 
-import copy
+import os
+from multiprocessing import Pool, shared_memory
+from scipy.spatial import cKDTree
 from .basic_skeleton_measures import getBasicSkelMeasures
+from helpers.skeleton_graph import getSkeletonGraph
+
+# shared mesh index of a worker process (filled by initTipWorker)
+WORKER_ARRAYS = {}
+MESH_ARRAYS = ['points', 'face_offsets', 'face_ids', 'vert_offsets', 
+	'vert_faces', 'ids']
 
 def setScalarsToIds(poly_data):
 	n_points = poly_data.GetNumberOfPoints()
@@ -30,64 +38,330 @@ def getTerminalEndpointTemp(poly_line, branch, ep_id):
 			return pid
 	return pid
 
-def getBranchNormalDirection(poly_line, branch):
-	n_points = branch.GetNumberOfPoints()
-	first = branch.GetPointId(0)
-	last = branch.GetPointId(int(n_points/2))
-	table = np.zeros((2,3))
-	
-	table[0] = poly_line.GetPoint(last)
-	table[1] = poly_line.GetPoint(first)
-	norm = table[1] - table[0]
+def getBranchNormalDirection(poly_line, branch_id):
+	graph = getSkeletonGraph(poly_line)
+	branch = graph.getBranch(branch_id)
+	n_points = len(branch)
+	first = branch[0]
+	last = branch[int(n_points/2)]
+	norm = graph.points[first] - graph.points[last]
 	return norm
 
-def clip_polydata(poly_data, cent, norm,thick):
-	
-	poly_copy = vtk.vtkPolyData()
-	poly_copy.DeepCopy(poly_data)
+def getMeshIndex(poly_data):
+	"""
+	Builds the arrays used to extract tip regions of a polygon mesh without
+	copying it (see getTipRegion): a KD-tree of the vertices, the vertices of
+	every face and the faces of every vertex (CSR).
 
+	Args:
+		poly_data (vtk.vtkPolyData): polygon mesh with point IDs as scalars 
+			(see setScalarsToIds)
 
-	cyl = vtk.vtkCylinder()
-	cyl.SetCenter(cent)
+	Returns:
+		Dict: dictionary with keys
+			- points: n_points x 3 vertex coordinates (np.array, float)
+			- tree: KD-tree of points (scipy.spatial.cKDTree)
+			- face_offsets, face_ids: vertices of every face (np.array, int)
+			- vert_offsets, vert_faces: faces of every vertex (np.array, int)
+			- ids: point scalars (np.array), None if not available
+	"""
+	points = nps.vtk_to_numpy(poly_data.GetPoints().GetData()).astype(float)
+	polys = poly_data.GetPolys()
+	face_offsets = nps.vtk_to_numpy(polys.GetOffsetsArray()).astype(int)
+	face_ids = nps.vtk_to_numpy(polys.GetConnectivityArray()).astype(int)
 
-	cyl.SetAxis(norm)
+	# faces of every vertex
+	labels = np.repeat(np.arange(len(face_offsets) - 1), np.diff(face_offsets))
+	order = np.argsort(face_ids, kind = 'stable')
+	vert_offsets = np.searchsorted(face_ids[order], \
+		np.arange(points.shape[0] + 1))
 
-	cyl.SetRadius(thick/2)
-	
-	plane = vtk.vtkPlane()
-	plane.SetOrigin(cent)
-	plane.SetNormal(norm)
-
-	clipper = vtk.vtkExtractPolyDataGeometry()
-	clipper.SetInputData(poly_copy)
-	clipper.SetImplicitFunction(cyl)
-	clipper.ExtractInsideOn()
-	
-	clipper.Update()
-	poly_copy = clipper.GetOutput()
-	
+	scalars = poly_data.GetPointData().GetScalars()
+	ids = None if scalars is None else nps.vtk_to_numpy(scalars)
+	return {'points': points, 'tree': cKDTree(points), 
+		'face_offsets': face_offsets, 'face_ids': face_ids, 
+		'vert_offsets': vert_offsets, 'vert_faces': labels[order], 'ids': ids}
 
-	
-	clipper = vtk.vtkExtractPolyDataGeometry()
-	clipper.SetInputData(poly_copy)
-
-	clipper.SetImplicitFunction(plane)
-	clipper.ExtractInsideOff()
-	clipper.Update()
-	poly_copy = clipper.GetOutput()
-
-	connect = vtk.vtkPolyDataConnectivityFilter()
-	connect.SetInputData(poly_copy)
-	connect.SetClosestPoint(cent)
-	connect.SetExtractionModeToClosestPointRegion()
-	connect.Update()
-	poly_copy = connect.GetOutput()
+def getTipRegions(mesh_index, cents, norms, thicks, max_neighbours = 1024):
+	"""
+	Obtains the tip region of every branch tip (see getTipRegion), starting 
+	at the seed vertex of the tip (see getTipSeeds).
+
+	Args:
+		mesh_index (dict): arrays of the polygon mesh (see getMeshIndex)
+		cents (np.array, float): n_tips x 3 locations of the branch tips
+		norms (np.array, float): n_tips x 3 branch directions
+		thicks (np.array, float): thickness of every branch
+		max_neighbours (int): largest number of closest vertices searched for
+			the seed of a tip
+
+	Returns:
+		list: point IDs (scalars) of the tip region of every tip
+	"""
+	seeds = getTipSeeds(mesh_index, cents, norms, thicks, max_neighbours)
+	return [getTipRegion(mesh_index, seeds[i], cents[i], norms[i], thicks[i]) \
+		for i in range(len(cents))]
+
+def getTipSeeds(mesh_index, cents, norms, thicks, max_neighbours = 1024):
+	"""
+	Obtains the seed vertex of every branch tip (see getRegionSeed). The 
+	closest vertices of all tips are searched at once in the KD-tree of the 
+	mesh, with twice as many neighbours (up to max_neighbours) for the tips 
+	without seed. Tips without seed among their max_neighbours closest 
+	vertices (e.g. if the branch is thin compared to the vertex spacing) have
+	no seed and an empty tip region.
+
+	Args:
+		mesh_index (dict): arrays of the polygon mesh (see getMeshIndex)
+		cents (np.array, float): n_tips x 3 locations of the branch tips
+		norms (np.array, float): n_tips x 3 branch directions
+		thicks (np.array, float): thickness of every branch
+		max_neighbours (int): largest number of closest vertices searched
+
+	Returns:
+		np.array (int): seed vertex of every tip, -1 if there is none
+	"""
+	n_tips = len(cents)
+	max_k = min(max_neighbours, mesh_index['points'].shape[0])
+	seeds = np.full(n_tips, -1)
+	todo = np.arange(n_tips)
+	k = min(64, max_k)
+	while len(todo):
+		# closest vertices of all remaining tips
+		dist, nbors = mesh_index['tree'].query(cents[todo], k = k)
+		dist = dist.reshape(len(todo), k)
+		nbors = nbors.reshape(len(todo), k)
+		found = np.zeros(len(todo), dtype = bool)
+		for i, tip in enumerate(todo):
+			seed = getRegionSeed(mesh_index, nbors[i], cents[tip], norms[tip], \
+				thicks[tip])
+
+			# vertices further away than the last neighbour can not be closer
+			if k < max_k and (seed < 0 or dist[i, -1] <= \
+					np.sqrt(np.sum((mesh_index['points'][seed] - 
+					cents[tip]) ** 2))):
+				continue
+			seeds[tip] = seed
+			found[i] = True
+		todo = todo[~found]
+		k = min(2 * k, max_k)
+	return seeds
+
+def getTipRegionsParallel(mesh_index, cents, norms, thicks, n_workers = None, \
+		chunk_size = 16, max_neighbours = 1024):
+	"""
+	Obtains the tip region of every branch tip (see getTipRegions) with a pool
+	of workers. The seeds of all tips are found here with the KD-tree of the
+	mesh (see getTipSeeds), such that the workers need no KD-tree. The other
+	arrays of the mesh index are placed in shared memory, the tips and their
+	seeds are divided in chunks of chunk_size tips and the regions are 
+	collected in tip order, such that the result does not depend on the
+	number of workers.
+
+	Args:
+		mesh_index (dict): arrays of the polygon mesh (see getMeshIndex)
+		cents (np.array, float): n_tips x 3 locations of the branch tips
+		norms (np.array, float): n_tips x 3 branch directions
+		thicks (np.array, float): thickness of every branch
+		n_workers (int): number of worker processes (defaults to the number 
+			of cores)
+		chunk_size (int): number of tips per chunk
+		max_neighbours (int): largest number of closest vertices searched for
+			the seed of a tip
+
+	Returns:
+		list: point IDs (scalars) of the tip region of every tip
+	"""
+	if n_workers is None:
+		n_workers = os.cpu_count()
+	n_tips = len(cents)
+	seeds = getTipSeeds(mesh_index, cents, norms, thicks, max_neighbours)
+	chunks = [(seeds[start:start + chunk_size], cents[start:start + chunk_size],
+		norms[start:start + chunk_size], thicks[start:start + chunk_size]) \
+		for start in range(0, n_tips, chunk_size)]
+	arrays = {key: mesh_index[key] for key in MESH_ARRAYS \
+		if mesh_index[key] is not None}
+
+	# place the arrays of the mesh index in shared memory
+	shared = {}
+	regions = []
 	try:
-		ids = nps.vtk_to_numpy(poly_copy.GetPointData().GetScalars())
-	except:
-		ids = []
+		for key, arr in arrays.items():
+			shm = shared_memory.SharedMemory(create = True, \
+				size = max(arr.nbytes, 1))
+			np.ndarray(arr.shape, dtype = arr.dtype, buffer = shm.buf)[:] = arr
+			shared[key] = shm
+		specs = {key: (shared[key].name, arr.shape, arr.dtype) \
+			for key, arr in arrays.items()}
+
+		with Pool(n_workers, initializer = initTipWorker, initargs = (specs,)) \
+				as pool:
+
+			# collect the regions in chunk order
+			for chunk_regions in pool.imap(getTipChunk, chunks):
+				regions.extend(chunk_regions)
+	finally:
+		for shm in shared.values():
+			shm.close()
+			shm.unlink()
+	return regions
+
+def initTipWorker(specs):
+	"""
+	Attaches a worker process to the shared arrays of the mesh index.
+
+	Args:
+		specs (dict): name, shape and dtype of the shared memory of each array
+
+	Returns:
+		None
+	"""
+	for key, (name, shape, dtype) in specs.items():
+		shm = shared_memory.SharedMemory(name = name)
+		WORKER_ARRAYS[key] = (shm, np.ndarray(shape, dtype = dtype, 
+			buffer = shm.buf))
 
-	return ids
+def getTipChunk(chunk):
+	"""
+	Obtains the tip regions of a chunk of tips from the shared mesh index (see
+	getTipRegion).
+
+	Args:
+		chunk (tuple): seed vertices, locations, branch directions and 
+			thickness of the tips
+
+	Returns:
+		list: point IDs (scalars) of the tip region of every tip in chunk
+	"""
+	mesh_index = {key: WORKER_ARRAYS[key][1] if key in WORKER_ARRAYS else \
+		None for key in MESH_ARRAYS}
+	return [np.array(getTipRegion(mesh_index, *tip)) for tip in zip(*chunk)]
+
+def getTipRegion(mesh_index, seed, cent, norm, thick):
+	"""
+	Obtains the tip region of a branch tip without copying or clipping the 
+	mesh: the faces of which all vertices are inside the cylinder around 
+	the branch direction and in front of the plane through the tip (see 
+	insideTipRegion) that are connected to the seed vertex. The faces are 
+	visited breadth-first.
+
+	Args:
+		mesh_index (dict): arrays of the polygon mesh (see getMeshIndex)
+		seed (int): vertex of a face in the tip region closest to the tip (see
+			getRegionSeed), -1 if there is none
+		cent (np.array, float): location of the branch tip
+		norm (np.array, float): branch direction
+		thick (float): thickness of the branch (cylinder diameter)
+
+	Returns:
+		np.array: point IDs (scalars) of the tip region
+	"""
+	if seed < 0 or mesh_index['ids'] is None:
+		return []
+	n_points = mesh_index['points'].shape[0]
+	visited = np.zeros(n_points, dtype = bool)
+	seen_faces = np.zeros(len(mesh_index['face_offsets']) - 1, dtype = bool)
+	front = np.array([seed])
+	while len(front):
+		faces = getVertexFaces(mesh_index, front)
+		faces = faces[~seen_faces[faces]]
+		seen_faces[faces] = True
+		faces = faces[insideFaces(mesh_index, faces, cent, norm, thick)]
+		front = np.unique(getFaceVertices(mesh_index, faces))
+		front = front[~visited[front]]
+		visited[front] = True
+	if not np.any(visited):
+		return []
+	return mesh_index['ids'][np.flatnonzero(visited)]
+
+def getRegionSeed(mesh_index, candidates, cent, norm, thick):
+	"""
+	Obtains the vertex closest to the tip of the faces in the tip region (the
+	faces of which all vertices are inside, see insideFaces). The vertex with 
+	the lowest ID is taken for equal distances.
+
+	Args:
+		mesh_index (dict): arrays of the polygon mesh (see getMeshIndex)
+		candidates (np.array, int): vertices closest to the tip
+		cent (np.array, float): location of the branch tip
+		norm (np.array, float): branch direction
+		thick (float): thickness of the branch (cylinder diameter)
+
+	Returns:
+		int: seed vertex, -1 if no candidate is a vertex of a face in the tip
+			region
+	"""
+	points = mesh_index['points']
+	candidates = candidates[candidates < points.shape[0]]
+	candidates = candidates[insideTipRegion(points[candidates], cent, norm, \
+		thick)]
+	if not len(candidates):
+		return -1
+
+	# candidates with a face in the tip region
+	offsets = mesh_index['vert_offsets']
+	counts = offsets[candidates + 1] - offsets[candidates]
+	pos = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, \
+		counts)
+	faces = mesh_index['vert_faces'][np.repeat(offsets[candidates], counts) + \
+		pos]
+	owner = np.repeat(np.arange(len(candidates)), counts)
+	candidates = np.unique(candidates[owner[insideFaces(mesh_index, faces, \
+		cent, norm, thick)]])
+	if not len(candidates):
+		return -1
+	dist = np.sum((points[candidates] - cent) ** 2, axis = 1)
+	return np.min(candidates[dist == np.min(dist)])
+
+def getVertexFaces(mesh_index, pids):
+	"""Returns the IDs of the faces of the vertices pids (unique)."""
+	offsets = mesh_index['vert_offsets']
+	counts = offsets[pids + 1] - offsets[pids]
+	pos = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, \
+		counts)
+	return np.unique(mesh_index['vert_faces'][np.repeat(offsets[pids], \
+		counts) + pos])
+
+def getFaceVertices(mesh_index, faces):
+	"""Returns the vertex IDs of the faces (concatenated)."""
+	offsets = mesh_index['face_offsets']
+	counts = offsets[faces + 1] - offsets[faces]
+	pos = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, \
+		counts)
+	return mesh_index['face_ids'][np.repeat(offsets[faces], counts) + pos]
+
+def insideFaces(mesh_index, faces, cent, norm, thick):
+	"""Returns whether all vertices of the faces are in the tip region."""
+	offsets = mesh_index['face_offsets']
+	pids = getFaceVertices(mesh_index, faces)
+	inside = insideTipRegion(mesh_index['points'][pids], cent, norm, thick)
+	counts = offsets[faces + 1] - offsets[faces]
+	if not len(faces):
+		return np.zeros(0, dtype = bool)
+	return np.logical_and.reduceat(inside, np.cumsum(counts) - counts)
+
+def insideTipRegion(coords, cent, norm, thick):
+	"""
+	Returns whether vertices are inside the cylinder (diameter thick) around
+	the branch direction and in front of the plane through the tip, with the
+	implicit functions of vtkCylinder and vtkPlane (boundary values are 
+	inside, as in vtkExtractPolyDataGeometry).
+
+	Args:
+		coords (np.array, float): n x 3 vertex coordinates
+		cent (np.array, float): location of the branch tip
+		norm (np.array, float): branch direction
+		thick (float): thickness of the branch (cylinder diameter)
+
+	Returns:
+		np.array (bool): True if inside tip region
+	"""
+	vecs = coords - cent
+	axis = norm / np.sqrt(np.sum(norm ** 2))
+	proj = vecs @ axis
+	cyl = np.sum(vecs ** 2, axis = 1) - proj * proj - (thick/2) * (thick/2)
+	plane = vecs @ norm
+	return (cyl <= 0) & (plane >= 0)
 
 def selectGoodPoints(endpoints, n_points):
 	mean = np.mean(n_points)
@@ -103,27 +377,43 @@ def selectGoodPoints(endpoints, n_points):
 
 
 
-def getEndPointsPolyData(poly_data, poly_line):
-	
-	basic_dict = getBasicSkelMeasures(poly_line)
+def getEndPointsPolyData(poly_data, poly_line, n_workers = 1, \
+		chunk_size = 16):
+	"""
+	Obtains the vertex IDs of a polygon mesh at the branch tips of its
+	skeleton graph: the region of the mesh inside a cylinder around every end
+	branch beyond its end point (see getTipRegion). Tip regions with an 
+	outlying number of vertices are ignored (see selectGoodPoints).
+
+	Args:
+		poly_data (vtk.vtkPolyData): polygon mesh with point IDs as scalars
+			(see setScalarsToIds)
+		poly_line (vtk.vtkPolyData or SkeletonGraph): skeleton graph
+		n_workers (int): number of worker processes, tips are processed in
+			this process if 1 and with the number of cores if None
+		chunk_size (int): number of tips per worker task
+
+	Returns:
+		Dict: dictionary with key-value:
+		- point_ids: vertex IDs at branch tips (np.array, int)
+	"""
+	graph = getSkeletonGraph(poly_line)
+	basic_dict = getBasicSkelMeasures(graph)
 	ep_ids = basic_dict['end_points']
 	eb_ids = basic_dict['end_branches']
 	max_thick = basic_dict['max_thick']
-	# prepare polydata
-	poly_ids = []
-
-	n_points = np.zeros(len(ep_ids))
-	for i in range(len(ep_ids)):
-
-		bid = eb_ids[i]
-		branch = poly_line.GetCell(bid)
-		end_point_loc = poly_line.GetPoint(ep_ids[i])
-		norm = getBranchNormalDirection(poly_line, branch)
-		thick = max_thick[bid]
-		ids = clip_polydata(poly_data, end_point_loc, norm, thick)
-
-		n_points[i] = len(ids)
-		poly_ids.append(copy.deepcopy(ids))
+	# extract the tip region of every end point
+	mesh_index = getMeshIndex(poly_data)
+	cents = graph.points[ep_ids]
+	norms = np.array([getBranchNormalDirection(graph, bid) for bid in eb_ids])
+	norms = norms.reshape(len(ep_ids), 3)
+	thicks = max_thick[eb_ids]
+	if n_workers == 1:
+		poly_ids = getTipRegions(mesh_index, cents, norms, thicks)
+	else:
+		poly_ids = getTipRegionsParallel(mesh_index, cents, norms, thicks, \
+			n_workers, chunk_size)
+	n_points = np.array([len(ids) for ids in poly_ids], dtype = float)
 
 	final_points = selectGoodPoints(poly_ids, n_points)
 	return {'point_ids':final_points}
\ No newline at end of file
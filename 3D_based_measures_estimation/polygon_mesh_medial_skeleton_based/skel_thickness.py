@@ -4,31 +4,26 @@ import numpy as np
 import copy
 import math as m 
 from .basic_skeleton_measures import getBasicSkelMeasures
+from helpers.skeleton_graph import getSkeletonGraph
 
 def getBranchWidthAndAngles(poly_line):
 	
 
-	skel_info = getBasicSkelMeasures(poly_line)
+	graph = getSkeletonGraph(poly_line)
+	skel_info = getBasicSkelMeasures(graph)
 	end_branches = skel_info['end_branches']
 
-	max_thick = MaxThickEnds(poly_line, end_branches)
-	min_thick = getMinimumThickness(poly_line,skel_info)
-	term_thick = getTerminalThickness(poly_line, skel_info)
-	end_angles = getEndBranchAngle(poly_line, skel_info, min_thick['db_loc'])
+	max_thick = MaxThickEnds(graph, end_branches)
+	min_thick = getMinimumThickness(graph,skel_info)
+	term_thick = getTerminalThickness(graph, skel_info)
+	end_angles = getEndBranchAngle(graph, skel_info, min_thick['db_loc'])
 	min_thick_ends = {'db': min_thick['db'][end_branches], 'db_loc': min_thick['db_loc'][end_branches]}
 	return {**max_thick, **min_thick_ends, **term_thick, **end_angles}
 
 def MaxThickEnds(poly_line, end_branches): 
-	n_branches = len(end_branches)
-	ids = np.zeros(n_branches, dtype = int)
-	thickness = np.zeros(n_branches)
-	for i,br in enumerate(end_branches):
-		branch = poly_line.GetCell(br)
-		n_points = branch.GetNumberOfPoints()
-		pid = branch.GetPointId(n_points- 1)
-		thick = poly_line.GetPointData().GetScalars().GetValue(pid)
-		ids[i] = pid
-		thickness[i] = thick
+	graph = getSkeletonGraph(poly_line)
+	ids = graph.ends[end_branches]
+	thickness = graph.thickness[ids].astype(float)
 	return {'da': thickness, 'da_loc': ids}
 
 def getMinimumThickness(poly_line, basic_info): 
@@ -38,63 +33,40 @@ def getMinimumThickness(poly_line, basic_info):
 
 	del basic_info
 
-	root_loc = poly_line.GetPoint(root_id)
+	graph = getSkeletonGraph(poly_line)
+	root_loc = graph.points[root_id]
 	del root_id, end_point_ids
-	n_branch = poly_line.GetNumberOfCells()
-	min_thick = np.zeros(n_branch)
-	min_id = np.zeros(n_branch, dtype = int)
-	
-	for i in range(n_branch):
-		if i in end_branch_ids:
-			ordered = True 
-		else:
-			ordered = False
-		branch = poly_line.GetCell(i)
-		bid, thick = getMinimumThicknessBranch(branch, poly_line, root_loc, ordered)
-
-		min_thick[i] = thick 
-		min_id[i] = bid
+	starts, ends = graph.starts, graph.ends
+
+	# junction of each branch: the last vertex of the end branches, otherwise
+	# the first or last vertex, whichever is closest to the root
+	dist_start = np.sum((graph.points[starts] - root_loc) ** 2, axis = 1)
+	dist_end = np.sum((graph.points[ends] - root_loc) ** 2, axis = 1)
+	junc_ids = np.where(dist_start <= dist_end, starts, ends)
+	junc_ids[end_branch_ids] = ends[end_branch_ids]
+
+	# difference between distance to the junction and the mean radius for the
+	# vertices of all branches
+	labels = graph.getBranchLabels()
+	junc_pids = junc_ids[labels]
+	dist = np.sqrt(np.sum((graph.points[graph.point_ids] - \
+		graph.points[junc_pids]) ** 2, axis = 1))
+	rad_sum = (graph.thickness[junc_pids] + graph.thickness[graph.point_ids])/2
+	min_sphere = np.abs(dist - rad_sum)
+	min_sphere[graph.point_ids == junc_pids] = 10000
+
+	# first vertex with the smallest difference in every branch
+	seg_min = np.minimum.reduceat(min_sphere, graph.offsets[:-1])
+	pos = np.where(min_sphere == seg_min[labels], np.arange(len(labels)), \
+		len(labels))
+	min_pos = np.minimum.reduceat(pos, graph.offsets[:-1])
+
+	min_id = graph.point_ids[min_pos]
+	min_thick = graph.thickness[min_id].astype(float)
 
 	return {'db': min_thick, 'db_loc':min_id}
 
 
-def getMinimumThicknessBranch(branch, poly_line, root_loc, ordered = False): 
-	n_points = branch.GetNumberOfPoints()
-	junc_id = branch.GetPointId(n_points - 1)
-
-	if not ordered:
-		dist = np.zeros(2)
-		for i,pid in enumerate([0, n_points -1]):
-			jid = branch.GetPointId(pid)
-			jloc = poly_line.GetPoint(jid)
-			dist[i] = vtk.vtkMath.Distance2BetweenPoints(jloc, root_loc)
-		min_dist = np.argmin(dist)
-		if min_dist == 0:
-			junc_id = branch.GetPointId(0)
-
-	junc_loc = poly_line.GetPoint(junc_id)
-	junc_d = poly_line.GetPointData().GetScalars().GetValue(junc_id)
-	min_sphere = np.zeros(n_points)
-	
-	for i in range(branch.GetNumberOfPoints()):
-		pid = branch.GetPointId(i)
-		if pid == junc_id:
-			min_sphere[i] = 10000
-			continue
-		p_loc = poly_line.GetPoint(pid)
-		p_d = poly_line.GetPointData().GetScalars().GetValue(pid)
-
-		dist = m.sqrt(vtk.vtkMath.Distance2BetweenPoints(junc_loc, p_loc))
-		rad_sum = (junc_d + p_d)/2
-		min_sphere[i] = np.abs(dist - rad_sum)
-
-	br_pid = np.argmin(min_sphere)
-
-	pid = branch.GetPointId(br_pid)
-
-	thick = poly_line.GetPointData().GetScalars().GetValue(pid)
-	return pid, thick
-
 def getTerminalThickness(poly_line,basic_info):
 	end_points = basic_info['end_points']
 	thickness = basic_info['medial_thickness']
@@ -102,76 +74,80 @@ def getTerminalThickness(poly_line,basic_info):
 
 def getEndBranchAngle(poly_line, basic_info, db_locs):
 
-	end_branches = copy.deepcopy(basic_info['end_branches'])
+	end_branches = np.asarray(basic_info['end_branches'], dtype = int)
 
 	del basic_info
-	angles = np.zeros(len(end_branches))
-	norms = np.zeros((len(end_branches),2,3))
-	juncs = np.zeros(len(end_branches), dtype = int)
-	for i,br in enumerate(end_branches):
-
-		angles[i],norms[i],juncs[i] = getBranchAngle(br, db_locs, poly_line)
+	graph = getSkeletonGraph(poly_line)
+	db_locs = np.asarray(db_locs, dtype = int)
+	n_end = len(end_branches)
+	juncs = graph.ends[end_branches]
+	junc_locs = graph.points[juncs]
+	br_normals = graph.points[db_locs[end_branches]] - junc_locs
+
+	# pairs of every end branch and the branches at its junction
+	inc_offsets, inc_branches = graph.getPointIncidence()
+	counts = inc_offsets[juncs + 1] - inc_offsets[juncs]
+	group = np.repeat(np.arange(n_end), counts)
+	group_start = np.cumsum(counts) - counts
+	pair_pos = np.arange(len(group)) - group_start[group]
+	neigh_ids = inc_branches[inc_offsets[juncs][group] + pair_pos]
+
+	# direction of every neighbouring branch, towards the first vertex from
+	# just before the middle of the branch onwards that is not at the
+	# junction if the minimum thickness is at the junction
+	neigh_normals = graph.points[db_locs[neigh_ids]] - junc_locs[group]
+	zero = np.flatnonzero(np.all(neigh_normals == 0, axis = 1))
+	if len(zero):
+		br_start = graph.offsets[neigh_ids[zero]]
+		br_size = graph.offsets[neigh_ids[zero] + 1] - br_start
+		first = np.maximum(br_size // 2 - 1, 0)
+		n_cand = br_size - first
+		cand_group = np.repeat(np.arange(len(zero)), n_cand)
+		cand_start = np.cumsum(n_cand) - n_cand
+		cand_pos = np.arange(len(cand_group)) - cand_start[cand_group] + \
+			first[cand_group]
+		cand_ids = graph.point_ids[br_start[cand_group] + cand_pos]
+		cand_normals = graph.points[cand_ids] - junc_locs[group[zero]][cand_group]
+		is_cand = np.any(cand_normals != 0, axis = 1)
+		sel = np.minimum.reduceat(np.where(is_cand, \
+			np.arange(len(cand_group)), len(cand_group)), cand_start)
+		found = sel < len(cand_group)
+		neigh_normals[zero[found]] = cand_normals[sel[found]]
+
+	# angles between the end branches and all their neighbours
+	br_pair = br_normals[group]
+	dot = np.sum(br_pair * neigh_normals, axis = 1)
+	norm = np.sqrt(np.sum(br_pair ** 2, axis = 1)) * \
+		np.sqrt(np.sum(neigh_normals ** 2, axis = 1))
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		pair_angles = np.arccos(np.clip(dot/norm, -1, 1))
+
+	# smallest angle per end branch (ignoring the branch itself), the normal
+	# is the entry with the same rank among the neighbours with an angle 
+	# > 0.001
+	valid = pair_angles > 0.0001
+	masked = np.where(valid, pair_angles, np.inf)
+	angles = np.full(n_end, np.inf)
+	np.minimum.at(angles, group, masked)
+	is_min = valid & (masked == angles[group])
+	first = np.full(n_end, len(group))
+	np.minimum.at(first, group, np.where(is_min, np.arange(len(group)), \
+		len(group)))
+	rank = np.zeros(n_end, dtype = int)
+	np.add.at(rank, group, valid & (np.arange(len(group)) < first[group]))
+
+	valid_norm = pair_angles > 0.001
+	norm_count = np.cumsum(valid_norm)
+	norm_rank = norm_count - (norm_count - valid_norm)[group_start][group]
+	norm_pos = np.flatnonzero(valid_norm & (norm_rank == rank[group] + 1))
+
+	norms = np.zeros((n_end,2,3))
+	norms[:,0] = br_normals
+	norms[group[norm_pos],1] = neigh_normals[norm_pos]
+	angles[np.isinf(angles)] = np.nan
 	return {'angle':angles, 'angle_normals': norms, 'angle_loc': juncs}
 
 
-def getBranchAngle(branch_id, sphere_ids, poly_line):
-
-	branch = poly_line.GetCell(branch_id)
-	n_points = branch.GetNumberOfPoints()
-	junc_id = branch.GetPointId(n_points - 1)
-
-	junc_loc = np.asarray(poly_line.GetPoint(junc_id))
-	br_loc = np.asarray(poly_line.GetPoint(sphere_ids[branch_id]))
-
-	br_normal = br_loc - junc_loc
-
-	in_cells = vtk.vtkIdList()
-	poly_line.GetPointCells(junc_id,in_cells)
-	n_cells = in_cells.GetNumberOfIds()
-	angles = np.zeros(n_cells)
-	norms = np.zeros((n_cells,3))
-
-	for i in range(n_cells):
-
-		neigh_id = in_cells.GetId(i)
-		neigh_loc = np.asarray(poly_line.GetPoint(sphere_ids[neigh_id]))
-		neigh_normal = neigh_loc - junc_loc
-		x = -1
-		while np.all((neigh_normal == 0)):
-			
-			neigh_branch = poly_line.GetCell(neigh_id)
-			sp_id = neigh_branch.GetPointId(int(neigh_branch.GetNumberOfPoints()/2)+x)
-			neigh_loc = np.asarray(poly_line.GetPoint(sp_id))
-			neigh_normal = neigh_loc - junc_loc
-			x +=1
-
-		norms[i] = neigh_normal
-		angles[i] = calcAngleNormals(br_normal, neigh_normal)
-
-	norms = norms[np.where(angles > 0.001)]
-	angles = angles[np.where(angles > 0.0001)]
-	norm_set = np.asarray([br_normal, norms[np.argmin(angles)]])
-
-	return np.min(angles),norm_set,junc_id
-
-
-def calcAngleNormals(normal1, normal2):
-
-	normal_array = np.zeros((2,3))
-	normal_array[0] = normal1
-	normal_array[1] = normal2
-	normal_array = normal_array ** 2
-	normal_array = np.sum(normal_array, axis = 1)
-	normal_array = np.sqrt(normal_array)
-
-	dot = np.sum(normal1 * normal2)
-	cos_angle = dot/(normal_array[0] * normal_array[1])
-
-	if np.abs(cos_angle) <= 1:
-		return m.acos(cos_angle)
-	else:
-		return m.acos(int(cos_angle))
-
 """def getSpheresAndAngles(coral_name, thickness_dict, line_dir = vtk.DIR_LINE):
 	basic_info = copy.deepcopy(thickness_dict[coral_name])
 	del thickness_dict
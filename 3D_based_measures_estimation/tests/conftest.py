@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other from the 3D_based_measures_estimation directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,267 @@
+import os
+import vtk
+import numpy as np
+import vtk.util.numpy_support as nps
+from Medial_axis_skeleton_based.skeleton_transformation import clean_skeleton
+from Medial_axis_skeleton_based.skeleton_transformation.post_skel import \
+	preprocessPolyData
+from Medial_axis_skeleton_based.basic_skeleton_measures import \
+	getJunctionEndPointIds
+from helpers.load_data import readVTK
+from helpers.skeleton_graph import getSkeletonGraph
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname( \
+	os.path.abspath(__file__))), 'example', 'data', 'vtk_line')
+
+def makeLines(points, lines):
+	"""
+	Makes a skeleton graph of vertex coordinates and lists of point IDs.
+	"""
+	vtk_points = vtk.vtkPoints()
+	vtk_points.SetData(nps.numpy_to_vtk(np.asarray(points, dtype = float), \
+		deep = True))
+	cells = vtk.vtkCellArray()
+	for line in lines:
+		cells.InsertNextCell(len(line), line)
+	poly_line = vtk.vtkPolyData()
+	poly_line.SetPoints(vtk_points)
+	poly_line.SetLines(cells)
+	thickness = nps.numpy_to_vtk(np.ones(len(points)), deep = True)
+	poly_line.GetPointData().SetScalars(thickness)
+	return poly_line
+
+def lineSet(poly_line):
+	"""
+	Lines as sorted tuples of vertex coordinates, independent of point IDs,
+	line order, direction and (for closed lines) first vertex.
+	"""
+	graph = getSkeletonGraph(poly_line)
+	lines = []
+	for i in range(graph.n_branches):
+		coords = [tuple(p) for p in graph.points[graph.getBranch(i)]]
+		if coords[0] == coords[-1]:
+			cycle = coords[:-1]
+			first = cycle.index(min(cycle))
+			cycle = cycle[first:] + cycle[:first]
+			back = cycle[:1] + cycle[1:][::-1]
+			coords = min(cycle, back) + [cycle[0]]
+		else:
+			coords = min(coords, coords[::-1])
+		lines.append(tuple(coords))
+	return sorted(lines)
+
+def baselineMergeBranches(line_data):
+	"""
+	mergeBranches before the single pass version (repeats until no merge ids
+	are left).
+	"""
+	complete = False
+	while not complete:
+		complete = True
+		merge_ids = getJunctionEndPointIds(line_data)['merge_ids']
+		if not len(merge_ids):
+			return line_data
+		to_delete = []
+		lines = []
+		in_cells = vtk.vtkIdList()
+		compid = 0
+		for pid in merge_ids:
+			line_data.GetPointCells(pid, in_cells)
+			cids = [in_cells.GetId(0), in_cells.GetId(1)]
+			for cid in cids:
+				if cid in to_delete:
+					complete = False
+					compid = pid
+			if complete == False and compid == pid:
+				compid = 0
+				continue
+
+			np_l = [line_data.GetCell(cids[0]).GetNumberOfPoints(),\
+				line_data.GetCell(cids[1]).GetNumberOfPoints()]
+			new_line = vtk.vtkIdList()
+			for c in range(2):
+				line = line_data.GetCell(cids[c])
+				if c == 0:
+					rev = (line.GetPointId(0) == pid)
+				else:
+					rev = (line.GetPointId(np_l[c]-1) == pid)
+				if rev:
+					rang = [np_l[c] -1 -i for i in range(np_l[c])]
+				else:
+					rang = [i for i in range(np_l[c])]
+				if c == 1:
+					rang.pop(0)
+				for i in rang:
+					new_line.InsertNextId(line.GetPointId(i))
+				to_delete.append(cids[c])
+			lines.append(new_line)
+
+		cells = vtk.vtkCellArray()
+		for i in range(line_data.GetNumberOfCells()):
+			if i not in to_delete:
+				cells.InsertNextCell(line_data.GetCell(i))
+		for line in lines:
+			cells.InsertNextCell(line)
+
+		poly_new = vtk.vtkPolyData()
+		poly_new.DeepCopy(line_data)
+		poly_new.SetLines(cells)
+		line_data = preprocessPolyData(poly_new)
+	return line_data
+
+def grid(n):
+	return [(i, j, 0) for j in range(n) for i in range(n)]
+
+def pid(i, j, n = 10):
+	return j * n + i
+
+def test_merge_chains():
+	# three arms of two or three lines each at a junction (4, 4)
+	lines = [
+		[pid(0, 4), pid(1, 4), pid(2, 4)],
+		[pid(2, 4), pid(3, 4), pid(4, 4)],
+		[pid(4, 4), pid(5, 4)],
+		[pid(5, 4), pid(6, 4), pid(7, 4)],
+		[pid(7, 4), pid(8, 4)],
+		[pid(4, 5), pid(4, 4)],
+		[pid(4, 6), pid(4, 5)],
+	]
+	poly_line = makeLines(grid(10), lines)
+	merged = clean_skeleton.mergeBranches(poly_line)
+	assert merged.GetNumberOfLines() == 3
+	assert lineSet(merged) == lineSet(baselineMergeBranches(poly_line))
+
+def test_merge_loops():
+	# a loop of three lines at a junction with a tail, and a separate closed
+	# loop of three lines without junction
+	lines = [
+		[pid(0, 0), pid(1, 0), pid(2, 0)],
+		[pid(2, 0), pid(3, 0), pid(3, 1)],
+		[pid(3, 1), pid(3, 2), pid(2, 2)],
+		[pid(2, 2), pid(2, 1), pid(2, 0)],
+		[pid(6, 6), pid(7, 6), pid(8, 6)],
+		[pid(8, 6), pid(8, 7), pid(8, 8)],
+		[pid(8, 8), pid(7, 8), pid(6, 7), pid(6, 6)],
+	]
+	offsets, point_ids = clean_skeleton.mergeChains(
+		np.cumsum([0] + [len(line) for line in lines]),
+		np.concatenate(lines), 100)
+	assert len(offsets) - 1 == 3
+	closed = [point_ids[offsets[i]:offsets[i+1]] for i in range(3)]
+	assert sum(line[0] == line[-1] for line in closed) == 2
+
+	poly_line = makeLines(grid(10), lines)
+	merged = clean_skeleton.mergeBranches(poly_line)
+	baseline = baselineMergeBranches(poly_line)
+	assert lineSet(merged) == lineSet(baseline)
+
+def test_merge_closed_loop():
+	lines = [
+		[pid(6, 6), pid(7, 6), pid(8, 6)],
+		[pid(8, 6), pid(8, 7), pid(8, 8)],
+		[pid(8, 8), pid(7, 8), pid(6, 7), pid(6, 6)],
+	]
+	poly_line = makeLines(grid(10), lines)
+	merged = clean_skeleton.mergeBranches(poly_line)
+
+	# every vertex once (the baseline merge walks a closed loop without
+	# junction twice, as it merges the closed line with itself)
+	assert merged.GetNumberOfLines() == 1
+	loop = getSkeletonGraph(merged).getBranch(0)
+	assert len(loop) == 8 and loop[0] == loop[-1]
+	assert len(set(loop.tolist())) == 7
+	baseline = getSkeletonGraph(baselineMergeBranches(poly_line)).getBranch(0)
+	assert set(baseline.tolist()) == set(loop.tolist())
+
+def test_merge_example():
+	# split every branch of the example skeleton in two or three lines
+	graph = getSkeletonGraph(readVTK('15Oki03', EXAMPLE_DIR))
+	lines = []
+	for i in range(graph.n_branches):
+		branch = graph.getBranch(i).tolist()
+		cuts = [0] + list(range(2, len(branch) - 1, 4))[:2] + [len(branch) - 1]
+		lines += [branch[a:b + 1] for a, b in zip(cuts[:-1], cuts[1:])]
+	assert len(lines) > graph.n_branches
+	poly_line = makeLines(graph.points, lines)
+
+	merged = clean_skeleton.mergeBranches(poly_line)
+	assert lineSet(merged) == lineSet(baselineMergeBranches(poly_line))
+	assert merged.GetNumberOfLines() == graph.n_branches
+
+def makeTree(paths):
+	"""
+	Makes vertices and CSR lines of paths of grid coordinates (shared
+	coordinates are shared vertices).
+	"""
+	coords = {}
+	lines = []
+	for path in paths:
+		lines.append([coords.setdefault(c, len(coords)) for c in path])
+	points = np.zeros((len(coords), 3))
+	for c, i in coords.items():
+		points[i,:2] = c
+	offsets = np.cumsum([0] + [len(line) for line in lines])
+	return points, offsets, np.concatenate(lines)
+
+def prunedLines(points, offsets, point_ids):
+	lines = []
+	for i in range(len(offsets) - 1):
+		coords = [tuple(points[p,:2]) for p in point_ids[offsets[i]:offsets[i+1]]]
+		lines.append(tuple(min(coords, coords[::-1])))
+	return sorted(lines)
+
+# a trunk and a long branch at junction (10, 0), with a short spur and a
+# short branch to junction (11, 0) with two more short spurs
+TRUNK = [(i, 0) for i in range(11)]
+LONG = [(10, -j) for j in range(11)]
+SPUR = [(10, 0), (10, 1), (10, 2)]
+INNER = [(10, 0), (11, 0)]
+SPURS = [[(11, 0), (11, 1)], [(11, 0), (12, 0)]]
+
+def test_prune_points():
+	# removing a spur at (11, 0) merges the rest into a new short spur, after
+	# which the trunk and long branch are merged
+	points, offsets, point_ids = makeTree([TRUNK, LONG, SPUR, INNER] + SPURS)
+	new_offsets, new_ids = clean_skeleton.pruneLines(offsets, point_ids, \
+		points, min_points = 4)
+	assert prunedLines(points, new_offsets, new_ids) == \
+		prunedLines(*makeTree([TRUNK + LONG[1:]]))
+
+def test_prune_length():
+	points, offsets, point_ids = makeTree([TRUNK, LONG, SPUR, INNER] + SPURS)
+	new_offsets, new_ids = clean_skeleton.pruneLines(offsets, point_ids, \
+		points, min_length = 2.5)
+	assert prunedLines(points, new_offsets, new_ids) == \
+		prunedLines(*makeTree([TRUNK + LONG[1:]]))
+
+	# the spur of length 2 is kept, the merged spur of length 2 as well
+	new_offsets, new_ids = clean_skeleton.pruneLines(offsets, point_ids, \
+		points, min_length = 1.5)
+	assert prunedLines(points, new_offsets, new_ids) == \
+		prunedLines(*makeTree([TRUNK, LONG, SPUR, INNER + SPURS[1][1:]]))
+
+def test_prune_fixed_point():
+	# pruning the result again changes nothing
+	points, offsets, point_ids = makeTree([TRUNK, LONG, SPUR, INNER] + SPURS)
+	for kwargs in [{'min_points': 4}, {'min_length': 1.5}]:
+		new_offsets, new_ids = clean_skeleton.pruneLines(offsets, point_ids, \
+			points, **kwargs)
+		again = clean_skeleton.pruneLines(new_offsets, new_ids, points, **kwargs)
+		assert prunedLines(points, *again) == \
+			prunedLines(points, new_offsets, new_ids)
+
+def test_prune_unconnected():
+	# short unconnected lines are removed, as by deleteShortEndBranches
+	points, offsets, point_ids = makeTree([TRUNK, [(0, 5), (1, 5)]])
+	new_offsets, new_ids = clean_skeleton.pruneLines(offsets, point_ids, \
+		points, min_points = 4)
+	assert prunedLines(points, new_offsets, new_ids) == \
+		prunedLines(*makeTree([TRUNK]))
+
+def test_prune_branches():
+	points, offsets, point_ids = makeTree([TRUNK, LONG, SPUR, INNER] + SPURS)
+	poly_line = makeLines(points, [point_ids[offsets[i]:offsets[i+1]].tolist() \
+		for i in range(len(offsets) - 1)])
+	pruned = clean_skeleton.pruneBranches(poly_line, min_points = 4)
+	assert pruned.GetNumberOfLines() == 1
+	assert pruned.GetNumberOfPoints() == 21
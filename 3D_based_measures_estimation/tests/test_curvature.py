@@ -0,0 +1,29 @@
+import vtk
+import numpy as np
+import vtk.util.numpy_support as nps
+from polygon_mesh_based import curvature
+
+def makeSphere():
+	sphere = vtk.vtkSphereSource()
+	sphere.SetRadius(2)
+	sphere.SetThetaResolution(24)
+	sphere.SetPhiResolution(16)
+	sphere.Update()
+	return sphere.GetOutput()
+
+def test_curvature_subset():
+	poly_data = makeSphere()
+	full = curvature.getCurvature(poly_data, engine = 'numpy')
+	vertex_ids = np.array([5, 0, 17, 5, 100])
+	subset = curvature.getCurvatureSubset(poly_data, vertex_ids)
+	for key, val in full.items():
+		assert np.allclose(subset[key], val[vertex_ids], rtol = 1e-12)
+
+def test_curvature_subset_no_faces():
+	# a vertex that is not used by any face has no curvature
+	poly_data = makeSphere()
+	points = poly_data.GetPoints()
+	new_id = points.InsertNextPoint(5, 5, 5)
+	subset = curvature.getCurvatureSubset(poly_data, [new_id, 3])
+	assert np.all(np.isnan([val[0] for val in subset.values()]))
+	assert not np.any(np.isnan([val[1] for val in subset.values()]))
@@ -0,0 +1,23 @@
+import vtk
+import numpy as np
+from polygon_mesh_based import curvature_cache
+
+def makeSphere():
+	sphere = vtk.vtkSphereSource()
+	sphere.SetThetaResolution(24)
+	sphere.SetPhiResolution(16)
+	sphere.Update()
+	return sphere.GetOutput()
+
+def test_cache_block_size(tmp_path):
+	poly_data = makeSphere()
+	keys = {curvature_cache.getMeshHash(poly_data, block_size = size) \
+		for size in [100, 1000000]}
+	assert len(keys) == 2
+
+	# every block size has its own result, a second call reads it
+	for size in [100, 1000000, 100]:
+		curvature = curvature_cache.getCachedCurvature(poly_data, 
+			cache_dir = str(tmp_path), block_size = size)
+		assert np.all(np.isfinite(curvature['Gauss']))
+	assert len(list(tmp_path.glob('*.npz'))) == 2
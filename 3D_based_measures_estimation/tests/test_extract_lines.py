@@ -0,0 +1,48 @@
+import vtk
+import numpy as np
+import vtk.util.numpy_support as nps
+from Medial_axis_skeleton_based.skeleton_transformation.extract_lines import \
+	SkelVoxToGraph
+
+def makeVoxelSkeleton(dims, voxels, value = 1.):
+	"""
+	Makes a voxel skeleton image (-1 outside the skeleton) of voxel indices.
+	"""
+	scal = -np.ones(dims[::-1], dtype = np.float32)
+	for i, j, k in voxels:
+		scal[k, j, i] = value
+	img = vtk.vtkImageData()
+	img.SetDimensions(dims)
+	img.GetPointData().SetScalars(nps.numpy_to_vtk(scal.ravel(), deep = True))
+	return img
+
+def voxelsToLines(img):
+	sg = SkelVoxToGraph()
+	sg.SetInputData(img)
+	sg.Update()
+	return sg.GetOutput()
+
+def test_straight_line():
+	# only 6 neighbours, the 18 and 26 neighbour groups have no candidates
+	img = makeVoxelSkeleton((12, 5, 5), [(i, 2, 2) for i in range(1, 11)])
+	graph = voxelsToLines(img)
+	assert graph.GetNumberOfPoints() == 10
+	assert graph.GetNumberOfCells() == 1
+	line = graph.GetCell(0).GetPointIds()
+	assert [line.GetId(i) for i in range(line.GetNumberOfIds())] == \
+		list(range(10))
+
+def test_diagonal_line():
+	# only 26 neighbours
+	img = makeVoxelSkeleton((7, 7, 7), [(i, i, i) for i in range(1, 6)])
+	graph = voxelsToLines(img)
+	assert graph.GetNumberOfCells() == 1
+	assert graph.GetCell(0).GetNumberOfPoints() == 5
+
+def test_junction():
+	voxels = [(i, 3, 3) for i in range(1, 8)] + [(4, j, 3) for j in range(4, 7)]
+	img = makeVoxelSkeleton((9, 8, 7), voxels)
+	graph = voxelsToLines(img)
+	assert graph.GetNumberOfCells() == 3
+	thickness = nps.vtk_to_numpy(graph.GetPointData().GetScalars())
+	assert np.all(thickness == 1)
@@ -0,0 +1,30 @@
+import vtk
+import numpy as np
+from polygon_mesh_based import curvature
+from polygon_mesh_based.mesh_operator import MeshOperator
+
+def test_adjacency_cancelling_weights():
+	# the edge (0, 1) is opposite of supplementary angles, such that its
+	# cotangent weights cancel
+	points = np.array([(0, 0, 0), (3, 0, 0), (-.5, .5, 0), (1.5, -.5, 0)])
+	faces = np.array([(0, 1, 2), (1, 0, 3)])
+	operator = MeshOperator(points, faces)
+	assert operator.laplacian[0, 1] == 0
+	assert operator.adjacency[0, 1] == 1 and operator.adjacency[1, 0] == 1
+	assert operator.adjacency.nnz == 10
+	assert np.array_equal(operator.getRingNeighbours([2]), [0, 1, 2])
+	assert np.array_equal(operator.getRingNeighbours([2], rings = 2), 
+		[0, 1, 2, 3])
+
+def test_operator_curvature():
+	sphere = vtk.vtkSphereSource()
+	sphere.SetThetaResolution(24)
+	sphere.SetPhiResolution(16)
+	sphere.Update()
+	operator = MeshOperator.fromPolyData(sphere.GetOutput(), block_size = 100)
+	full = curvature.getCurvature(sphere.GetOutput(), engine = 'numpy')
+	for key, val in operator.getCurvature().items():
+		assert np.allclose(val, full[key], rtol = 1e-12)
+
+	# the Laplacian of a constant is 0
+	assert np.allclose(operator.laplacian @ np.ones(operator.n_points), 0)
@@ -0,0 +1,157 @@
+import vtk
+import numpy as np
+import vtk.util.numpy_support as nps
+from polygon_mesh_medial_skeleton_based import polydata_endpoints
+
+def clip_polydata(poly_data, cent, norm, thick):
+	"""
+	Tip region of the mesh as clipped by VTK (the reference of getTipRegions).
+	"""
+	cyl = vtk.vtkCylinder()
+	cyl.SetCenter(cent)
+	cyl.SetAxis(norm)
+	cyl.SetRadius(thick/2)
+
+	plane = vtk.vtkPlane()
+	plane.SetOrigin(cent)
+	plane.SetNormal(norm)
+
+	clipper = vtk.vtkExtractPolyDataGeometry()
+	clipper.SetInputData(poly_data)
+	clipper.SetImplicitFunction(cyl)
+	clipper.ExtractInsideOn()
+	clipper.Update()
+	poly_copy = clipper.GetOutput()
+
+	clipper = vtk.vtkExtractPolyDataGeometry()
+	clipper.SetInputData(poly_copy)
+	clipper.SetImplicitFunction(plane)
+	clipper.ExtractInsideOff()
+	clipper.Update()
+	poly_copy = clipper.GetOutput()
+
+	connect = vtk.vtkPolyDataConnectivityFilter()
+	connect.SetInputData(poly_copy)
+	connect.SetClosestPoint(cent)
+	connect.SetExtractionModeToClosestPointRegion()
+	connect.Update()
+	scalars = connect.GetOutput().GetPointData().GetScalars()
+	return np.zeros(0, dtype = int) if scalars is None else \
+		nps.vtk_to_numpy(scalars)
+
+def makeBranchedMesh(radius = .15):
+	"""
+	Makes a tube mesh of a branched skeleton (a trunk that splits twice in two
+	branches) with a sphere at every tip, with point IDs as scalars.
+
+	Returns:
+		vtk.vtkPolyData: triangle mesh
+		np.array (float): n_tips x 3 locations of the tips
+		np.array (float): n_tips x 3 branch directions
+	"""
+	points = [(0, 0, 0), (0, 0, 2)]
+	lines = [[0, 1]]
+	tips = []
+	for i, sx in enumerate([-1, 1]):
+		points.append((sx, 0, 3))
+		lines.append([1, len(points) - 1])
+		fork = len(points) - 1
+		for sy in [-1, 1]:
+			points.append((sx * 1.5, sy * .8, 4 + i))
+			lines.append([fork, len(points) - 1])
+			tips.append(len(points) - 1)
+	points = np.array(points, dtype = float)
+
+	append = vtk.vtkAppendPolyData()
+	for line in lines:
+		source = vtk.vtkLineSource()
+		source.SetPoint1(points[line[0]])
+		source.SetPoint2(points[line[1]])
+		source.SetResolution(20)
+		tube = vtk.vtkTubeFilter()
+		tube.SetInputConnection(source.GetOutputPort())
+		tube.SetRadius(radius)
+		tube.SetNumberOfSides(12)
+		append.AddInputConnection(tube.GetOutputPort())
+	for tip in tips:
+		sphere = vtk.vtkSphereSource()
+		sphere.SetCenter(points[tip])
+		sphere.SetRadius(radius)
+		sphere.SetThetaResolution(16)
+		sphere.SetPhiResolution(16)
+		append.AddInputConnection(sphere.GetOutputPort())
+	triangles = vtk.vtkTriangleFilter()
+	triangles.SetInputConnection(append.GetOutputPort())
+	clean = vtk.vtkCleanPolyData()
+	clean.SetInputConnection(triangles.GetOutputPort())
+	clean.Update()
+
+	mesh = vtk.vtkPolyData()
+	mesh.DeepCopy(clean.GetOutput())
+	mesh.GetPointData().Initialize()
+	polydata_endpoints.setScalarsToIds(mesh)
+
+	parents = {line[1]: line[0] for line in lines}
+	norms = np.array([points[tip] - points[parents[tip]] for tip in tips])
+	return mesh, points[tips], norms
+
+def getTips(thicks, shift = 0):
+	mesh, cents, norms = makeBranchedMesh()
+	n_tips = len(cents)
+	cents = np.repeat(cents, len(thicks), axis = 0)
+	norms = np.repeat(norms, len(thicks), axis = 0)
+	thicks = np.tile(thicks, n_tips)
+
+	# tips moved along the branch towards the cap of the sphere
+	cents += shift * norms / np.linalg.norm(norms, axis = 1)[:,None]
+	return mesh, cents, norms, thicks
+
+def test_tip_regions():
+	mesh, cents, norms, thicks = getTips(np.linspace(.03, .3, 10))
+
+	# tips moved off the branch, such that the closest vertex in the cylinder
+	# is often not a vertex of a face in the cylinder
+	rng = np.random.default_rng(0)
+	cents = np.concatenate([cents] + [cents + rng.normal(scale = .08, \
+		size = cents.shape) for i in range(4)])
+	norms = np.tile(norms, (5, 1))
+	thicks = np.tile(thicks, 5)
+
+	mesh_index = polydata_endpoints.getMeshIndex(mesh)
+	regions = polydata_endpoints.getTipRegions(mesh_index, cents, norms, thicks)
+	n_equal, n_seeded = 0, 0
+	for i, region in enumerate(regions):
+		ref = np.sort(clip_polydata(mesh, cents[i], norms[i], thicks[i]))
+		if len(ref):
+			assert np.array_equal(np.sort(region), ref)
+			n_equal += 1
+		else:
+			# VTK seeds a vertex without faces in the tip region, the region
+			# is made of the faces of the closest vertex that has one
+			assert np.all(polydata_endpoints.insideTipRegion( \
+				mesh_index['points'][region], cents[i], norms[i], thicks[i]))
+			n_seeded += (len(region) > 0)
+	assert n_equal > len(regions) // 2 and n_seeded > 0
+
+def test_tip_regions_thin():
+	# tips without a face in the cylinder have an empty tip region
+	mesh, cents, norms, thicks = getTips([.01], shift = .1)
+	mesh_index = polydata_endpoints.getMeshIndex(mesh)
+	seeds = polydata_endpoints.getTipSeeds(mesh_index, cents, norms, thicks, \
+		max_neighbours = 8)
+	assert np.all(seeds == -1)
+	regions = polydata_endpoints.getTipRegions(mesh_index, cents, norms, \
+		thicks, max_neighbours = 8)
+	for i, region in enumerate(regions):
+		assert not len(region)
+		assert not len(clip_polydata(mesh, cents[i], norms[i], thicks[i]))
+
+def test_tip_regions_parallel():
+	mesh, cents, norms, thicks = getTips([.5, .2, .06], shift = .05)
+	mesh_index = polydata_endpoints.getMeshIndex(mesh)
+	regions = polydata_endpoints.getTipRegions(mesh_index, cents, norms, thicks)
+	parallel = polydata_endpoints.getTipRegionsParallel(mesh_index, cents, \
+		norms, thicks, n_workers = 2, chunk_size = 4)
+	assert len(parallel) == len(regions)
+	for region, other in zip(regions, parallel):
+		assert np.array_equal(np.sort(region), np.sort(other))
@@ -0,0 +1,22 @@
+import numpy as np
+from polygon_mesh_medial_skeleton_based.skel_thickness import getEndBranchAngle
+from helpers.skeleton_graph import SkeletonGraph
+
+def makeGraph(points, lines):
+	offsets = np.cumsum([0] + [len(line) for line in lines])
+	return SkeletonGraph(np.asarray(points, dtype = float), 
+		np.ones(len(points)), offsets, np.concatenate(lines))
+
+def test_angle_one_point_branch():
+	# an end branch to junction 0 along y, a neighbouring branch along x, an
+	# unconnected branch and a one-point branch at the junction (of which the
+	# minimum thickness is at the junction)
+	points = [(0, 0, 0), (0, 2, 0), (0, 1, 0), (1, 0, 0), (2, 0, 0), 
+		(5, 5, 0), (1, 5, 0)]
+	lines = [[1, 2, 0], [0, 3, 4], [5, 6], [0]]
+	graph = makeGraph(points, lines)
+	db_locs = np.array([2, 3, 6, 0])
+	angles = getEndBranchAngle(graph, {'end_branches': np.array([0])}, db_locs)
+	assert np.isclose(angles['angle'][0], np.pi / 2)
+	assert np.allclose(angles['angle_normals'][0], [(0, 1, 0), (1, 0, 0)])
+	assert angles['angle_loc'][0] == 0
@@ -0,0 +1,112 @@
+import vtk
+import numpy as np
+import vtk.util.numpy_support as nps
+from Medial_axis_skeleton_based.skeleton_transformation import skeletonization
+from Medial_axis_skeleton_based.skeleton_transformation.skeletonization import \
+	skeletonizeTiled
+from Medial_axis_skeleton_based.skeleton_transformation.pre_skel import \
+	voxelizePolyData, getVoxelGrid
+from helpers.load_data import readMHD
+
+def centreLineSkeleton(in_dir, filename):
+	"""
+	Replaces skel_itk: keeps the foreground voxels on the y axis (the axis of
+	the cylinder) with a thickness of 1, as a float image.
+	"""
+	vox_img = readMHD(filename, in_dir)
+	scal = nps.vtk_to_numpy(vox_img.GetPointData().GetScalars())
+	dims = vox_img.GetDimensions()
+	ijk = np.column_stack(np.unravel_index(np.arange(len(scal)), \
+		dims[::-1])[::-1])
+	coords = np.asarray(vox_img.GetOrigin()) + ijk * \
+		np.asarray(vox_img.GetSpacing())
+	half = vox_img.GetSpacing()[0] / 2
+	on_axis = np.all((coords[:,[0,2]] >= -half) & (coords[:,[0,2]] < half), \
+		axis = 1)
+	skel = np.where((scal > 0) & on_axis, 1, -1).astype(np.float32)
+
+	voxel_skel = vtk.vtkImageData()
+	voxel_skel.CopyStructure(vox_img)
+	voxel_skel.GetPointData().SetScalars(nps.numpy_to_vtk(skel, deep = True))
+	return voxel_skel
+
+def makeCylinder():
+	cylinder = vtk.vtkCylinderSource()
+	cylinder.SetHeight(3)
+	cylinder.SetRadius(.5)
+	cylinder.SetResolution(32)
+	triangles = vtk.vtkTriangleFilter()
+	triangles.SetInputConnection(cylinder.GetOutputPort())
+	triangles.Update()
+	return triangles.GetOutput()
+
+def test_skeletonize_tiled(monkeypatch, tmp_path):
+	monkeypatch.setattr(skeletonization, 'makeVoxelSkeleton', \
+		centreLineSkeleton)
+
+	# tiles of 16 voxels do not divide the grid, the line crosses 3 seams
+	skel = skeletonizeTiled(makeCylinder(), spacing = .05, tile_size = 16, \
+		overlap = 4, n_workers = 2, skel_dir = str(tmp_path))
+	assert skel.GetNumberOfLines() == 1
+	assert list(tmp_path.iterdir()) == []
+	assert skel.GetNumberOfPoints() > 48
+	points = nps.vtk_to_numpy(skel.GetPoints().GetData())
+	assert np.ptp(points[:,1]) > 2.4
+	assert np.allclose(points[:,[0,2]], 0, atol = .05)
+
+def test_clip_tile_mesh():
+	# surface of a sphere with a cylinder through it (vertices on the lines of
+	# a voxel grid)
+	sphere = vtk.vtkSphereSource()
+	sphere.SetRadius(1)
+	sphere.SetThetaResolution(40)
+	sphere.SetPhiResolution(30)
+	append = vtk.vtkAppendPolyData()
+	append.AddInputConnection(sphere.GetOutputPort())
+	append.AddInputData(makeCylinder())
+	append.Update()
+	surface = vtk.vtkFlyingEdges3D()
+	surface.SetInputData(voxelizePolyData(append.GetOutput(), .04, lean = True))
+	surface.SetValue(0, 127.5)
+	surface.Update()
+	poly_data = surface.GetOutput()
+
+	# every clipped mesh is voxelized as the whole mesh in its tile
+	spacing = [.05] * 3
+	origin, dims = getVoxelGrid(poly_data, spacing)
+	n_clipped = 0
+	for extent, core in skeletonization.getTiles(dims, 16, 4):
+		vox_img = voxelizePolyData(poly_data, spacing, lean = True, \
+			extent = extent)
+		voxels = nps.vtk_to_numpy(vox_img.GetPointData().GetScalars())
+		tile_mesh = skeletonization.clipTileMesh(poly_data, extent, origin, \
+			spacing)
+		if not tile_mesh.GetNumberOfCells():
+			assert not np.any(voxels)
+			continue
+		n_clipped += tile_mesh.GetNumberOfCells() < poly_data.GetNumberOfCells()
+		tile_img = voxelizePolyData(tile_mesh, spacing, lean = True, \
+			extent = extent, origin = origin)
+		assert tile_img.GetDimensions() == vox_img.GetDimensions()
+		assert np.array_equal(voxels, 
+			nps.vtk_to_numpy(tile_img.GetPointData().GetScalars()))
+	assert n_clipped > 0
+
+def test_bridge_seams():
+	# one internal seam at x = 256, the grid is not a multiple of the tiles
+	dims = np.array([300, 10, 10])
+	line = [(i, 5, 5) for i in range(240, 255)] + \
+		[(i, 5, 5) for i in range(257, 280)]
+	ids = np.sort([i + dims[0] * (j + dims[1] * k) for i, j, k in line])
+	values = np.ones(len(ids), dtype = np.float32)
+
+	bridged, bridged_values = skeletonization.bridgeSeams(ids, values, dims, \
+		256, bridge = 3)
+	gap = [i + dims[0] * (5 + dims[1] * 5) for i in (255, 256)]
+	assert np.all(np.isin(gap, bridged))
+	assert len(bridged) == len(ids) + 2
+	assert np.all(bridged_values == 1)
+
+	graph = skeletonization.voxelsToGraph(bridged, bridged_values, dims, \
+		[0, 0, 0], [1, 1, 1])
+	assert graph.GetNumberOfLines() == 1